@@ -12,8 +12,13 @@ from discord_handler.handler import removeOldChannels,Scheduler
 from discord_handler.cdos import cmdHandler
 from loghandler.loghandler import setup_logging
 from discord_handler.client import client
+from discord_handler.cdo_meta import ReactionRouter
 from api.reddit import RedditParser
 from database.handler import updateMatches,updateOverlayData
+from api.calls import DiskCache
+from database.executor import DBWriter
+from database.players import PlayerIndexFile
+from database.cache import SettingsCache, PermissionCache
 
 
 setup_logging()
@@ -66,6 +71,17 @@ async def on_message_edit(before : discord.Message, after : discord.Message):
         await cmdHandler(after)
     except discord.errors.HTTPException:
         pass
+
+@client.event
+async def on_reaction_add(reaction : discord.Reaction, user : discord.User):
+    """
+    Reactions on responses of commandos are passed to their handler by the ReactionRouter
+    :param reaction:
+    :param user:
+    :return:
+    """
+    ReactionRouter.dispatch(reaction, user)
+
 path = os.path.dirname(os.path.realpath(__file__))
 
 #secret file contains secret of bot as well as other stuff (masterUser)
@@ -77,6 +93,11 @@ except:
     sys.exit()
 
 logger.info("updating initial data")
+DiskCache.enable()
+PlayerIndexFile.enable()
+SettingsCache.load()
+PermissionCache.load()
+DBWriter.start()
 updateOverlayData()
 updateMatches()
 
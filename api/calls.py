@@ -1,6 +1,19 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlparse
 import json
-from typing import Dict, List, Callable, Union
+import asyncio
+import functools
+import threading
+import time
+import os
+import sqlite3
+import random
+import logging
+import hashlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Callable, Union, Iterator
 from dateutil import parser
 import re
 import xml.etree.ElementTree as ET
@@ -8,6 +21,8 @@ from unidecode import unidecode
 
 from database.models import Federation,Competition,Association,Match,Season,Team,Player
 
+logger = logging.getLogger(__name__)
+
 
 class ApiCalls:
     """
@@ -32,6 +47,645 @@ class DataCalls:
     liveData = "matches/en/live/info"
     standings = "livescores/de/standings/bycup"
 
+class HttpClient:
+    """
+    Process wide http session for all calls to FIFA. Every FIFA host gets its own connection pool, which keeps its
+    connections alive between calls, so polling doesn't need a new TCP/TLS handshake for every request.
+    """
+    hosts = [ApiCalls.api_home, DataCalls.data_home]
+    poolMaxSize = 16
+    timeout = (5, 30)
+    session = None
+    adapters = {}
+
+    @staticmethod
+    def configure(poolMaxSize: int = None, timeout: Union[float, tuple] = None):
+        """
+        Changes the pool sizes or timeouts. The session is recreated with the next request.
+        :param poolMaxSize: Maximum number of connections kept alive per host
+        :param timeout: Timeout for requests, either a single value or a (connect, read) tuple in seconds
+        """
+        if poolMaxSize is not None:
+            HttpClient.poolMaxSize = poolMaxSize
+        if timeout is not None:
+            HttpClient.timeout = timeout
+        HttpClient.close()
+
+    @staticmethod
+    def close():
+        if HttpClient.session is not None:
+            HttpClient.session.close()
+        HttpClient.session = None
+        HttpClient.adapters = {}
+
+    @staticmethod
+    def getSession() -> requests.Session:
+        if HttpClient.session is None:
+            session = requests.Session()
+            session.headers.update({'Accept-Encoding': 'gzip, deflate',
+                                    'Connection': 'keep-alive'})
+            adapters = {}
+            for url in HttpClient.hosts:
+                host = urlparse(url)
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HttpClient.poolMaxSize)
+                session.mount(f"{host.scheme}://{host.netloc}/", adapter)
+                adapters[host.netloc] = adapter
+            HttpClient.adapters = adapters
+            HttpClient.session = session
+        return HttpClient.session
+
+    @staticmethod
+    def get(url: str, params: Dict = None, **kwargs) -> requests.Response:
+        """
+        Performs a get request through the shared session
+        :param url: Full url of the request
+        :param params: parameters for the request
+        :return: Response object of the requests library
+        """
+        return HttpClient.getSession().get(url, params=params, timeout=HttpClient.timeout, **kwargs)
+
+    @staticmethod
+    def poolStatistics() -> Dict[str, Dict[str, int]]:
+        """
+        Returns the state of the connection pools for every FIFA host.
+        - requests: Requests done through the pool
+        - connections: Connections opened so far. Much lower than requests if keep-alive works
+        - idle: Connections that are currently open and waiting for reuse
+        - active: Connections currently in use
+        - maxSize: Maximum number of connections kept alive
+        """
+        HttpClient.getSession()
+        stats = {}
+        for host, adapter in HttpClient.adapters.items():
+            hostStats = {'requests': 0, 'connections': 0, 'idle': 0, 'active': 0, 'maxSize': HttpClient.poolMaxSize}
+            for key in adapter.poolmanager.pools.keys():
+                pool = adapter.poolmanager.pools.get(key)
+                if pool is None:
+                    continue
+                idleList = list(pool.pool.queue) if pool.pool is not None else []
+                hostStats['requests'] += pool.num_requests
+                hostStats['connections'] += pool.num_connections
+                hostStats['idle'] += len([i for i in idleList if i is not None])
+                hostStats['active'] += pool.pool.maxsize - len(idleList) if pool.pool is not None else 0
+            stats[host] = hostStats
+        return stats
+
+class ResponseCache:
+    """
+    Bounded LRU cache for the raw responses of FIFA. Entries are keyed by url and parameters and expire after the
+    time to live given in ttlPolicy for the keyword of the call. The longest keyword matching the beginning of
+    the called keyword is used, calls without a matching keyword use defaultTTL. A ttl of 0 disables caching.
+    """
+    maxSize = 1024
+    defaultTTL = 60
+    ttlPolicy = {
+        ApiCalls.federations: 24 * 3600,
+        ApiCalls.countries: 24 * 3600,
+        ApiCalls.competitions: 24 * 3600,
+        ApiCalls.seasons: 24 * 3600,
+        ApiCalls.teams: 24 * 3600,
+        ApiCalls.specificTeam: 24 * 3600,
+        ApiCalls.teamSearch: 24 * 3600,
+        ApiCalls.playerInfo: 24 * 3600,
+        ApiCalls.playerSearch: 24 * 3600,
+        ApiCalls.matches: 60,
+        ApiCalls.topScorer: 5 * 60,
+        ApiCalls.live: 10,
+        DataCalls.liveData: 10,
+        DataCalls.standings: 5 * 60,
+    }
+    entries = OrderedDict()
+    lock = threading.Lock()
+    hits = 0
+    misses = 0
+
+    @staticmethod
+    def ttl(keyword: str) -> float:
+        """
+        Returns the time to live in seconds for a given keyword
+        :param keyword: Keyword of the call, i.e. ApiCalls.specificTeam + "/1234"
+        """
+        matches = [i for i in ResponseCache.ttlPolicy.keys() if keyword.startswith(i)]
+        if len(matches) == 0:
+            return ResponseCache.defaultTTL
+        return ResponseCache.ttlPolicy[max(matches, key=len)]
+
+    @staticmethod
+    def key(url: str, params: Dict) -> tuple:
+        return (url, tuple(sorted((str(key), str(val)) for key, val in params.items())))
+
+    @staticmethod
+    def get(url: str, params: Dict) -> Union[bytes, None]:
+        key = ResponseCache.key(url, params)
+        with ResponseCache.lock:
+            entry = ResponseCache.entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del ResponseCache.entries[key]
+                ResponseCache.misses += 1
+                return None
+            ResponseCache.entries.move_to_end(key)
+            ResponseCache.hits += 1
+            return entry[2]
+
+    @staticmethod
+    def put(keyword: str, url: str, params: Dict, content: bytes, ttl: float = None):
+        ttl = ResponseCache.ttl(keyword) if ttl is None else ttl
+        if ttl <= 0:
+            return
+        key = ResponseCache.key(url, params)
+        with ResponseCache.lock:
+            ResponseCache.entries[key] = (keyword, time.monotonic() + ttl, content)
+            ResponseCache.entries.move_to_end(key)
+            while len(ResponseCache.entries) > ResponseCache.maxSize:
+                ResponseCache.entries.popitem(last=False)
+
+    @staticmethod
+    def invalidate(keyword: str = None):
+        """
+        Removes entries from the cache.
+        :param keyword: All entries with a keyword starting with this are removed. Clears the whole cache if None.
+        """
+        with ResponseCache.lock:
+            if keyword is None:
+                ResponseCache.entries.clear()
+                return
+            for key in [key for key, entry in ResponseCache.entries.items() if entry[0].startswith(keyword)]:
+                del ResponseCache.entries[key]
+
+    @staticmethod
+    def statistics() -> Dict[str, int]:
+        return {'hits': ResponseCache.hits,
+                'misses': ResponseCache.misses,
+                'entries': len(ResponseCache.entries),
+                'maxSize': ResponseCache.maxSize}
+
+class DiskCache:
+    """
+    Persistent cache for raw responses, stored in a sqlite file next to the database. Responses that are still
+    within the ttl of the ResponseCache are read from disk, older ones are revalidated with If-None-Match and
+    If-Modified-Since, so unchanged data comes back as 304 without a body. This way a restart doesn't have to
+    download the whole catalogue again. Only calls with a ttl of at least minTTL are stored, live data is not.
+    Calls restricted to a time window are not stored either, as the window moves with every sync.
+    Disabled until enable is called.
+    """
+    fileName = "api_cache.sqlite3"
+    minTTL = 60
+    windowParams = ['from', 'to']
+    maxAge = 7 * 24 * 3600
+    connection = None
+    lock = threading.Lock()
+    hits = 0
+    revalidated = 0
+    stored = 0
+
+    @staticmethod
+    def enable(directory: str = None):
+        """
+        Opens the cache file
+        :param directory: Directory of the cache file. Defaults to the directory of the django database
+        """
+        if directory is None:
+            from django.conf import settings
+            directory = os.path.dirname(settings.DATABASES['default']['NAME'])
+        with DiskCache.lock:
+            if DiskCache.connection is not None:
+                DiskCache.connection.close()
+            DiskCache.connection = sqlite3.connect(os.path.join(directory, DiskCache.fileName),
+                                                   check_same_thread=False)
+            DiskCache.connection.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, etag TEXT, "
+                                         "last_modified TEXT, stored REAL, content BLOB)")
+            DiskCache.connection.execute("DELETE FROM responses WHERE stored < ?", (time.time() - DiskCache.maxAge,))
+            DiskCache.connection.commit()
+
+    @staticmethod
+    def disable():
+        with DiskCache.lock:
+            if DiskCache.connection is not None:
+                DiskCache.connection.close()
+            DiskCache.connection = None
+
+    @staticmethod
+    def enabled() -> bool:
+        return DiskCache.connection is not None
+
+    @staticmethod
+    def key(url: str, params: Dict) -> str:
+        return json.dumps(ResponseCache.key(url, params))
+
+    @staticmethod
+    def get(url: str, params: Dict) -> Union[tuple, None]:
+        """
+        Returns the stored entry for a call
+        :return: Tuple of content, etag, last modified and time it was stored, None if nothing is stored
+        """
+        with DiskCache.lock:
+            if DiskCache.connection is None:
+                return None
+            return DiskCache.connection.execute("SELECT content, etag, last_modified, stored FROM responses "
+                                                "WHERE key = ?", (DiskCache.key(url, params),)).fetchone()
+
+    @staticmethod
+    def put(url: str, params: Dict, content: bytes, etag: str = None, lastModified: str = None):
+        with DiskCache.lock:
+            if DiskCache.connection is None:
+                return
+            DiskCache.connection.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                                         (DiskCache.key(url, params), etag, lastModified, time.time(), content))
+            DiskCache.connection.commit()
+            DiskCache.stored += 1
+
+    @staticmethod
+    def touch(url: str, params: Dict):
+        with DiskCache.lock:
+            if DiskCache.connection is None:
+                return
+            DiskCache.connection.execute("UPDATE responses SET stored = ? WHERE key = ?",
+                                         (time.time(), DiskCache.key(url, params)))
+            DiskCache.connection.commit()
+            DiskCache.revalidated += 1
+
+    @staticmethod
+    def statistics() -> Dict[str, int]:
+        return {'enabled': DiskCache.enabled(),
+                'hits': DiskCache.hits,
+                'revalidated': DiskCache.revalidated,
+                'stored': DiskCache.stored}
+
+class RateLimiter:
+    """
+    Limits the outgoing traffic to FIFA. Every host has a token bucket, refilled with rate tokens per second. The
+    rate adapts: it is halved whenever FIFA answers with 429 or a server error, or the request fails, and slowly
+    grows back with successful calls. Calls that are not live calls leave liveReserve tokens in the bucket, so live
+    polling keeps priority over bulk syncs. Failed calls are retried with jittered exponential backoff, Retry-After
+    is followed up to retryAfterMax, so a single call doesn't block a worker for long. At most maxConcurrent
+    requests are running at the same time.
+    """
+    maxRate = 10.0
+    minRate = 0.5
+    rateIncrease = 0.1
+    burst = 20
+    liveReserve = 5
+    maxConcurrent = 8
+    maxRetries = 4
+    backoffBase = 1.0
+    backoffMax = 60.0
+    retryAfterMax = 10.0
+    liveKeywords = [ApiCalls.live, DataCalls.liveData]
+    buckets = {}
+    lock = threading.Lock()
+    semaphore = None
+    semaphoreSize = 0
+    running = 0
+    throttled = 0
+    retries = 0
+
+    @staticmethod
+    def isLive(keyword: str) -> bool:
+        return any(keyword.startswith(i) for i in RateLimiter.liveKeywords)
+
+    @staticmethod
+    def bucket(host: str) -> Dict[str, float]:
+        """
+        Returns the refilled bucket of a host. Needs to be called with the lock held.
+        """
+        now = time.monotonic()
+        bucket = RateLimiter.buckets.get(host)
+        if bucket is None:
+            bucket = {'tokens': float(RateLimiter.burst), 'rate': RateLimiter.maxRate, 'updated': now}
+            RateLimiter.buckets[host] = bucket
+        bucket['tokens'] = min(float(RateLimiter.burst), bucket['tokens'] + (now - bucket['updated']) * bucket['rate'])
+        bucket['updated'] = now
+        return bucket
+
+    @staticmethod
+    def tryAcquire(host: str, live: bool) -> float:
+        """
+        Tries to take a token for a request to host
+        :param host: Host of the request
+        :param live: Live calls may use the tokens reserved for them
+        :return: 0 if a token was taken, otherwise the time in seconds until one is available
+        """
+        with RateLimiter.lock:
+            bucket = RateLimiter.bucket(host)
+            needed = 1 if live else 1 + RateLimiter.liveReserve
+            if bucket['tokens'] >= needed:
+                bucket['tokens'] -= 1
+                return 0
+            return (needed - bucket['tokens']) / bucket['rate']
+
+    @staticmethod
+    def slots() -> threading.BoundedSemaphore:
+        """
+        Returns the semaphore limiting the concurrent requests, it is recreated if maxConcurrent changed
+        """
+        with RateLimiter.lock:
+            if RateLimiter.semaphore is None or RateLimiter.semaphoreSize != RateLimiter.maxConcurrent:
+                RateLimiter.semaphore = threading.BoundedSemaphore(RateLimiter.maxConcurrent)
+                RateLimiter.semaphoreSize = RateLimiter.maxConcurrent
+            return RateLimiter.semaphore
+
+    @staticmethod
+    def acquire(host: str, live: bool):
+        while True:
+            waitTime = RateLimiter.tryAcquire(host, live)
+            if waitTime == 0:
+                return
+            time.sleep(waitTime)
+
+    @staticmethod
+    def feedback(host: str, success: bool):
+        with RateLimiter.lock:
+            bucket = RateLimiter.bucket(host)
+            if success:
+                bucket['rate'] = min(RateLimiter.maxRate, bucket['rate'] + RateLimiter.rateIncrease)
+            else:
+                RateLimiter.throttled += 1
+                bucket['rate'] = max(RateLimiter.minRate, bucket['rate'] / 2)
+                bucket['tokens'] = 0.0
+
+    @staticmethod
+    def backoff(attempt: int, retryAfter: str = None) -> float:
+        """
+        Returns the time to wait before the next attempt, using Retry-After if FIFA sends it
+        """
+        try:
+            return max(0.0, min(RateLimiter.retryAfterMax, float(retryAfter)))
+        except (TypeError, ValueError):
+            delay = min(RateLimiter.backoffMax, RateLimiter.backoffBase * 2 ** attempt)
+            return delay / 2 + random.uniform(0, delay / 2)
+
+    @staticmethod
+    def get(keyword: str, url: str, params: Dict = None, headers: Dict = None) -> requests.Response:
+        """
+        Performs a rate limited get request through the HttpClient, retrying on 429, server errors, timeouts and
+        connection errors. The exception of the last attempt is raised.
+        :param keyword: Keyword of the call, used to determine its priority
+        :param url: Full url of the call
+        :param params: parameters for the call
+        :param headers: additional headers
+        :return: Response of the last attempt
+        """
+        host = urlparse(url).netloc
+        live = RateLimiter.isLive(keyword)
+        attempt = 0
+        while True:
+            RateLimiter.acquire(host, live)
+            req = None
+            with RateLimiter.slots():
+                with RateLimiter.lock:
+                    RateLimiter.running += 1
+                try:
+                    req = HttpClient.get(url, params=params, headers=headers)
+                except requests.RequestException as e:
+                    RateLimiter.feedback(host, False)
+                    if attempt >= RateLimiter.maxRetries:
+                        raise
+                    error = f"{e.__class__.__name__}"
+                finally:
+                    with RateLimiter.lock:
+                        RateLimiter.running -= 1
+
+            if req is not None:
+                success = req.status_code != 429 and req.status_code < 500
+                RateLimiter.feedback(host, success)
+                if success or attempt >= RateLimiter.maxRetries:
+                    return req
+                error = f"status {req.status_code}"
+
+            delay = RateLimiter.backoff(attempt, None if req is None else req.headers.get('Retry-After'))
+            logger.warning(f"{url} failed with {error}, retrying in {delay:.1f}s")
+            RateLimiter.retries += 1
+            attempt += 1
+            time.sleep(delay)
+
+    @staticmethod
+    def budget() -> Dict[str, Dict[str, float]]:
+        """
+        Returns the current budget for every host: available tokens and the current rate in requests per second
+        """
+        with RateLimiter.lock:
+            budget = {}
+            for host in list(RateLimiter.buckets.keys()):
+                bucket = RateLimiter.bucket(host)
+                budget[host] = {'tokens': round(bucket['tokens'], 1), 'rate': round(bucket['rate'], 2)}
+            return budget
+
+    @staticmethod
+    def statistics() -> Dict[str, int]:
+        return {'running': RateLimiter.running,
+                'maxConcurrent': RateLimiter.maxConcurrent,
+                'throttled': RateLimiter.throttled,
+                'retries': RateLimiter.retries}
+
+class InFlightCall:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Coalesces identical calls that are running at the same time. The first caller does the actual request, all
+    others that ask for the same url and parameters while it is running wait for it and receive its result.
+    """
+    lock = threading.Lock()
+    inFlight = {}
+    calls = 0
+    deduplicated = 0
+
+    @staticmethod
+    def do(key, func: Callable):
+        """
+        Executes func, unless a call with the same key is already running
+        :param key: Identifier of the call
+        :param func: Function without parameters doing the call
+        :return: Result of func
+        """
+        with SingleFlight.lock:
+            SingleFlight.calls += 1
+            call = SingleFlight.inFlight.get(key)
+            leader = call is None
+            if leader:
+                call = InFlightCall()
+                SingleFlight.inFlight[key] = call
+            else:
+                SingleFlight.deduplicated += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with SingleFlight.lock:
+                del SingleFlight.inFlight[key]
+            call.event.set()
+        return call.result
+
+    @staticmethod
+    def statistics() -> Dict[str, int]:
+        return {'calls': SingleFlight.calls,
+                'deduplicated': SingleFlight.deduplicated,
+                'inFlight': len(SingleFlight.inFlight)}
+
+class SyncTracker:
+    """
+    Collects the fingerprints of a single sync job, see Fingerprints. The fingerprints are only stored
+    with commit, after the data of the job was written successfully.
+    """
+    def __init__(self, jobName: str, jobKey: tuple):
+        self.jobName = jobName
+        self.jobKey = jobKey
+        self.rows = {}
+        self.endpoints = {}
+
+    def filter(self, func: Callable, reqList: List) -> List:
+        """
+        Returns the rows of reqList that changed since the last committed sync
+        :param func: Function parsing the rows
+        :param reqList: Rows returned by the API
+        """
+        name = (self.jobName, func.__name__)
+        endpointKey = self.jobKey + (func.__name__,)
+        endpointHash = Fingerprints.hash(reqList)
+        with Fingerprints.lock:
+            generation = Fingerprints.generations.get(name, 0)
+            if Fingerprints.endpoints.get(endpointKey) == (endpointHash, generation):
+                Fingerprints.skippedEndpoints += 1
+                Fingerprints.skippedRows += len(reqList)
+                return []
+
+        self.endpoints[endpointKey] = (endpointHash, name)
+        changedList = []
+        with Fingerprints.lock:
+            for resDict in reqList:
+                rowHash = Fingerprints.hash(resDict)
+                rowKey = name + (Fingerprints.rowID(resDict, rowHash),)
+                if Fingerprints.rows.get(rowKey) == rowHash:
+                    Fingerprints.skippedRows += 1
+                    continue
+                self.rows[rowKey] = rowHash
+                changedList.append(resDict)
+        return changedList
+
+    def commit(self, skippedIDs: List = ()):
+        """
+        Stores the collected fingerprints. Rows that were not saved are left out, so they are handled again
+        with the next sync.
+        :param skippedIDs: IDs of rows that were not written to the DB
+        """
+        #the API delivers ids as strings, the models mostly use integer primary keys
+        skippedIDs = set([str(i) for i in skippedIDs])
+        rows = dict([(rowKey, rowHash) for rowKey, rowHash in self.rows.items()
+                     if str(rowKey[2]) not in skippedIDs])
+        with Fingerprints.lock:
+            changedNames = set([rowKey[:2] for rowKey in rows.keys()])
+            for name in changedNames:
+                Fingerprints.generations[name] = Fingerprints.generations.get(name, 0) + 1
+            Fingerprints.rows.update(rows)
+            if len(rows) == len(self.rows):
+                for endpointKey, (endpointHash, name) in self.endpoints.items():
+                    Fingerprints.endpoints[endpointKey] = (endpointHash, Fingerprints.generations.get(name, 0))
+        self.rows = {}
+        self.endpoints = {}
+
+class Fingerprints:
+    """
+    Remembers a hash of every row and every full result that was synced from the API. Data fetched through
+    fetch is compared against these hashes within loop, and unchanged rows are neither parsed nor written
+    again. A whole result is skipped if it is identical to the last sync of the same call, as long as no other
+    call changed rows of the same kind in the meantime. The hashes are kept in memory, so the first sync after a
+    start always handles all data.
+    """
+    idKeys = ['IdMatch', 'IdSeason', 'IdCompetition', 'IdTeam', 'IdConfederation', 'IdCountry']
+    windowKeys = ['fromDate', 'toDate']
+    rows = {}
+    endpoints = {}
+    generations = {}
+    lock = threading.Lock()
+    local = threading.local()
+    skippedRows = 0
+    skippedEndpoints = 0
+
+    @staticmethod
+    def hash(data) -> bytes:
+        return hashlib.blake2b(json.dumps(data, sort_keys=True).encode(), digest_size=16).digest()
+
+    @staticmethod
+    def rowID(resDict: Dict, rowHash: bytes):
+        for key in Fingerprints.idKeys:
+            if isinstance(resDict, dict) and resDict.get(key) is not None:
+                return resDict[key]
+        return rowHash
+
+    @staticmethod
+    def current() -> Union[SyncTracker, None]:
+        return getattr(Fingerprints.local, 'tracker', None)
+
+    @staticmethod
+    def fetch(func: Callable, kwargs: Dict) -> tuple:
+        """
+        Calls a getAll function, only returning the objects that changed since the last committed sync.
+        :param func: getAll function
+        :param kwargs: parameters for func
+        :return: Tuple of the result of func and the SyncTracker, which needs to be committed after saving
+        """
+        keyArgs = [(key, val) for key, val in kwargs.items() if key not in Fingerprints.windowKeys]
+        tracker = SyncTracker(func.__name__, (func.__name__, tuple(sorted(keyArgs))))
+        Fingerprints.local.tracker = tracker
+        try:
+            return func(**kwargs), tracker
+        finally:
+            Fingerprints.local.tracker = None
+
+    @staticmethod
+    def clear():
+        with Fingerprints.lock:
+            Fingerprints.rows.clear()
+            Fingerprints.endpoints.clear()
+            Fingerprints.generations.clear()
+
+    @staticmethod
+    def statistics() -> Dict[str, int]:
+        return {'rows': len(Fingerprints.rows),
+                'skippedRows': Fingerprints.skippedRows,
+                'skippedCalls': Fingerprints.skippedEndpoints}
+
+class ApiExecutor:
+    """
+    Thread pool in which the blocking requests of the api layer are executed when they are awaited from a
+    coroutine. This keeps the discord event loop responsive while we are waiting for FIFA.
+    """
+    maxWorkers = 8
+    executor = None
+
+    @staticmethod
+    def get() -> ThreadPoolExecutor:
+        if ApiExecutor.executor is None:
+            ApiExecutor.executor = ThreadPoolExecutor(max_workers=ApiExecutor.maxWorkers)
+        return ApiExecutor.executor
+
+def asyncApiCall(func: Callable) -> Callable:
+    """
+    Creates an awaitable variant of a blocking function of this module. The function itself is run within
+    the ApiExecutor, so the calling coroutine doesn't block the event loop during the request.
+    :param func: Blocking api function
+    :return: Coroutine function with the same parameters as func
+    """
+    async def func_wrapper(*args, **kwargs):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(ApiExecutor.get(), functools.partial(func, *args, **kwargs))
+    func_wrapper.__doc__ = func.__doc__
+    func_wrapper.__name__ = f"async{func.__name__[0].upper()}{func.__name__[1:]}"
+    return func_wrapper
+
 
 def loop(func: Callable, reqList: List) -> List:
     """
@@ -42,6 +696,10 @@ def loop(func: Callable, reqList: List) -> List:
     :param reqList: Result List from the Api call
     :return: A list containting model objects from django models
     """
+    tracker = Fingerprints.current()
+    if tracker is not None:
+        reqList = tracker.filter(func, reqList)
+
     returnList = []
     for resDict in reqList:
         returnList.append(func(resDict=resDict))
@@ -49,6 +707,60 @@ def loop(func: Callable, reqList: List) -> List:
     return returnList
 
 
+def fetchContent(home: str, keyword: str, params: Dict) -> bytes:
+    """
+    Returns the raw content for a call to FIFA. Successful responses are stored in the ResponseCache
+    and served from there until they expire. Identical calls running at the same time share one request.
+    :param home: Base url of the call, i.e. ApiCalls.api_home
+    :param keyword: Keyword of the call, appended to home
+    :param params: parameters for the call
+    :return: Body of the response
+    """
+    url = home + keyword
+    content = ResponseCache.get(url, params)
+    if content is not None:
+        return content
+
+    return SingleFlight.do(ResponseCache.key(url, params), functools.partial(requestContent, keyword, url, params))
+
+def requestContent(keyword: str, url: str, params: Dict) -> bytes:
+    """
+    Does the actual request for fetchContent. If the DiskCache is enabled, responses are read from disk
+    or revalidated against the stored version.
+    :param keyword: Keyword of the call
+    :param url: Full url of the call
+    :param params: parameters for the call
+    :return: Body of the response
+    """
+    ttl = ResponseCache.ttl(keyword)
+    useDisk = DiskCache.enabled() and ttl > 0 and ttl >= DiskCache.minTTL \
+              and not any([i in params.keys() for i in DiskCache.windowParams])
+    stored = DiskCache.get(url, params) if useDisk else None
+    headers = {}
+    if stored is not None:
+        storedContent, etag, lastModified, storedTime = stored
+        age = time.time() - storedTime
+        if age < ttl:
+            DiskCache.hits += 1
+            ResponseCache.put(keyword, url, params, storedContent, ttl=ttl - age)
+            return storedContent
+        if etag is not None:
+            headers['If-None-Match'] = etag
+        if lastModified is not None:
+            headers['If-Modified-Since'] = lastModified
+
+    req = RateLimiter.get(keyword, url, params=params, headers=headers)
+    if req.status_code == 304 and stored is not None:
+        DiskCache.touch(url, params)
+        ResponseCache.put(keyword, url, params, stored[0])
+        return stored[0]
+
+    if req.status_code == 200:
+        ResponseCache.put(keyword, url, params, req.content)
+        if useDisk:
+            DiskCache.put(url, params, req.content, req.headers.get('ETag'), req.headers.get('Last-Modified'))
+    return req.content
+
 def makeAPICall(keyword: str, payload: Dict = None) -> Union[List, Dict]:
     """
     Makes a call to the API using the requests library. Returns the machine
@@ -58,11 +770,11 @@ def makeAPICall(keyword: str, payload: Dict = None) -> Union[List, Dict]:
     :return: List or dict containing the data
     """
     params = payload if payload != None else {}
-    req = requests.get(ApiCalls.api_home + keyword, params=params)
+    data = json.loads(fetchContent(ApiCalls.api_home, keyword, params).decode())
     try:
-        return json.loads(req.content.decode())['Results']
+        return data['Results']
     except (KeyError, TypeError) as e:
-        return json.loads(req.content.decode())
+        return data
 
 def makeMiddlewareCall(keyword: str, payload: Dict = None) -> Dict:
     """
@@ -73,18 +785,77 @@ def makeMiddlewareCall(keyword: str, payload: Dict = None) -> Dict:
     :return: Dictionary containing data
     """
     params = payload if payload != None else {}
-    req = requests.get(DataCalls.data_home + keyword, params=params)
-    data = req.content.decode()
-    data = re.sub(r"_\w+\(","",data)
-    data = data.replace(")","")
-    return json.loads(data)
+    return decodeJsonp(fetchContent(DataCalls.data_home, keyword, params))
+
+jsonWhitespace = re.compile(rb"\s*")
+
+def decodeJsonp(content: bytes) -> Union[Dict, List]:
+    """
+    Decodes a JSONP response of the middleware, i.e. _callback({...}). The bounds of the callback are searched
+    within the raw bytes and only the payload in between is parsed, without decoding the whole body first or
+    replacing anything in it. Plain JSON is decoded as well.
+    :param content: Raw body of the response
+    :return: Decoded payload
+    """
+    start = jsonWhitespace.match(content).end()
+    end = len(content)
+    if content[start:start + 1] not in (b"{", b"["):
+        bracket = content.find(b"(", start)
+        end = content.rfind(b")")
+        if bracket == -1 or end <= bracket:
+            raise json.JSONDecodeError("Expecting JSONP callback", content.decode(errors='replace'), start)
+        start = bracket + 1
+    return json.loads(content[start:end])
+
+def normaliseFirstName(name: str) -> str:
+    return unidecode(name.lower().replace("ü","ue").replace("ö","oe").replace("ä","ae"))
+
+def normaliseLastName(name: str) -> str:
+    # ö is replaced with e for last names since the first import, stored names rely on it
+    return unidecode(name.lower().replace("ü","ue").replace("ö","e").replace("ä","ae"))
+
+playerDataUrl = 'http://c3420952.r52.cf0.rackcdn.com/playerdata.xml' #todo replace this with a dynamic link generation
+
+def iterPlayerInfo(chunkSize: int = 64 * 1024) -> Iterator[Player]:
+    """
+    Streams the player image database and yields one Player object per entry. The file is parsed while it is
+    downloaded and every entry is dropped from the tree after it was parsed, so memory usage stays the same
+    independent of the size of the file.
+    :param chunkSize: Number of bytes read from the connection at once
+    :return: Iterator over Player objects
+    """
+    req = HttpClient.get(playerDataUrl, stream=True)
+    xmlParser = ET.XMLPullParser(events=('start', 'end'))
+    depth = 0
+    parent = None
+    try:
+        for chunk in req.iter_content(chunk_size=chunkSize):
+            xmlParser.feed(chunk)
+            for event, element in xmlParser.read_events():
+                if event == 'start':
+                    depth += 1
+                    if depth == 2:
+                        parent = element
+                    continue
+
+                if depth == 3:
+                    yield getAllPlayerInfo(resDict=element)
+                    element.clear()
+                    parent.remove(element)
+                depth -= 1
+        xmlParser.close()
+    finally:
+        req.close()
 
 def getAllPlayerInfo(**kwargs) -> Union[List, Player]:
+    """
+    Gets all players from the player image database. Prefer iterPlayerInfo for the full database, as this
+    function keeps all players in memory.
+    :param kwargs: Empty or resDict from loop
+    :return: Full list of Player objects or single Player object
+    """
     if len(kwargs.keys()) == 0:
-        data = requests.get('http://c3420952.r52.cf0.rackcdn.com/playerdata.xml') #todo replace this with a dynamic link generation
-        dataList = ET.ElementTree(ET.fromstring(data.text))
-        dataList = dataList.getroot()[0].getchildren()
-        return loop(getAllPlayerInfo,dataList)
+        return list(iterPlayerInfo())
     elif 'resDict' in kwargs.keys() and len(kwargs.keys()) == 1:
         res = dict(kwargs['resDict'].items())
         if 'i' in res.keys():
@@ -92,8 +863,8 @@ def getAllPlayerInfo(**kwargs) -> Union[List, Player]:
         else:
             image = 'missing_player.jpg'
         return Player(
-            firstName = unidecode(res['f'].lower().replace("ü","ue").replace("ö","oe").replace("ä","ae")),
-            lastName=unidecode(res['s'].lower().replace("ü","ue").replace("ö","e").replace("ä","ae")),
+            firstName = normaliseFirstName(res['f']),
+            lastName=normaliseLastName(res['s']),
             birthDate=res['d'],
             imageLink= "https://cdn.soccerwiki.org/images/player/"+image
         )
@@ -268,15 +1039,21 @@ def getAllMatches(**kwargs) -> Union[List, Match]:
     Structurally the same as all other initialize API functions. The initial call
     with empty kwargs starts the loop, the same function will be called again to
     actually parse the result.
-    :param kwargs: either idCompetitions and id Season or resDict from loop
+    :param kwargs: either idCompetitions and id Season or resDict from loop. Optionally fromDate and toDate
+    restrict the call to matches within this time window (UTC).
     :return: Full List of Match objects, or single Match object
     """
-    if 'idCompetitions' in kwargs.keys() and 'idSeason' in kwargs.keys() and len(kwargs.keys()) == 2:
+    if 'idCompetitions' in kwargs.keys() and 'idSeason' in kwargs.keys() \
+            and set(kwargs.keys()) <= {'idCompetitions', 'idSeason', 'fromDate', 'toDate'}:
         payload = {
             'idCompetition': kwargs['idCompetitions'],
             'idSeason': kwargs['idSeason'],
             'count': 1000
         }
+        if 'fromDate' in kwargs.keys():
+            payload['from'] = kwargs['fromDate'].strftime("%Y-%m-%dT%H:%M:%SZ")
+        if 'toDate' in kwargs.keys():
+            payload['to'] = kwargs['toDate'].strftime("%Y-%m-%dT%H:%M:%SZ")
         reqDict = makeAPICall(ApiCalls.matches, payload)
         return loop(getAllMatches, reqDict)
     elif 'resDict' in kwargs.keys() and len(kwargs.keys()) == 1:
@@ -354,3 +1131,16 @@ def getTeamsSearchedByName(name : str) -> List:
     payload = {"name":name}
     reqDict = makeAPICall(ApiCalls.teamSearch,payload=payload)
     return reqDict
+
+asyncMakeAPICall = asyncApiCall(makeAPICall)
+asyncMakeMiddlewareCall = asyncApiCall(makeMiddlewareCall)
+asyncGetAllPlayerInfo = asyncApiCall(getAllPlayerInfo)
+asyncGetAllFederations = asyncApiCall(getAllFederations)
+asyncGetAllCountries = asyncApiCall(getAllCountries)
+asyncGetAllCompetitions = asyncApiCall(getAllCompetitions)
+asyncGetAllSeasons = asyncApiCall(getAllSeasons)
+asyncGetAllTeams = asyncApiCall(getAllTeams)
+asyncGetAllMatches = asyncApiCall(getAllMatches)
+asyncGetSpecificTeam = asyncApiCall(getSpecificTeam)
+asyncGetLiveMatches = asyncApiCall(getLiveMatches)
+asyncGetTeamsSearchedByName = asyncApiCall(getTeamsSearchedByName)
@@ -11,6 +11,7 @@ import re
 from discord_handler.client import client
 from support.helper import task
 from database.models import MatchEvents, Goal, Match
+from database.executor import DBWriter
 
 logger = logging.getLogger(__name__)
 
@@ -82,7 +83,8 @@ class RedditParser:
                     newList = RedditParser.reddit.subreddit('soccer').new(limit=50)
                     result = RedditParser.parseReddit(i, newList)
                     if result is not None:
-                        Goal(match=i.match, player=i.matchEvent.player, minute=i.matchEvent.minute, link=result).save()
+                        goal = Goal(match=i.match, player=i.matchEvent.player, minute=i.matchEvent.minute, link=result)
+                        await DBWriter.run(goal.save)
                         await i.callback(i, result)
                         RedditParser.liveEventList.remove(i)
 
@@ -7,13 +7,37 @@ from dateutil import parser
 from pytz import UTC
 import unidecode
 
-from database.models import Competition, Season, Player
-from database.handler import getAndSaveData
-from api.calls import makeAPICall, getAllSeasons, ApiCalls, makeMiddlewareCall, DataCalls
+from database.models import Competition, Season
+from database.players import PlayerLookup
+from database.handler import saveData
+from api.calls import asyncMakeAPICall, getAllSeasons, ApiCalls, asyncMakeMiddlewareCall, DataCalls, asyncApiCall\
+    , Fingerprints
 from discord_handler.cdo_meta import InfoObj
+from database.executor import DBExecutor
 
 logger = logging.getLogger(__name__)
 
+asyncFetch = asyncApiCall(Fingerprints.fetch)
+
+
+async def currentSeason(competition: Competition) -> Season:
+    """
+    Returns the current season of a competition. If no season is stored yet, the seasons are fetched from the API
+    within the ApiExecutor and stored through the database executor.
+    :param competition: competition Object. Needs to be valid, no further check is done
+    :return: Latest season of the competition
+    """
+    latestSeason = lambda: Season.objects.filter(competition=competition).order_by('start_date').last()
+    season = await DBExecutor.run(latestSeason)
+    if season is None:
+        data, tracker = await asyncFetch(getAllSeasons, {'idCompetitions': competition.id})
+        await DBExecutor.run(saveData, getAllSeasons, data, tracker)
+        season = await DBExecutor.run(latestSeason)
+        if season is None:
+            raise ValueError(f"No season for {competition}")
+
+    return season
+
 
 async def getTopScorers(competition: Competition) -> InfoObj:
     """
@@ -21,15 +45,8 @@ async def getTopScorers(competition: Competition) -> InfoObj:
     :param competition: competition Object. Needs to be valid, no further check is done
     :return: InfoObj that can be directly fed into a CDOInternalResponse
     """
-    season = Season.objects.filter(competition=competition)
-    if season == None or len(season) == 0:
-        getAndSaveData(getAllSeasons, idCompetitions=competition.id)
-        season = Season.objects.filter(competition=competition)
-        if season == None or len(season) == 0:
-            raise ValueError(f"No season for {competition}")
-
-    season = season.order_by('start_date').last()
-    data = makeAPICall(ApiCalls.topScorer + f"/{season.id}/topscorers")
+    season = await currentSeason(competition)
+    data = await asyncMakeAPICall(ApiCalls.topScorer + f"/{season.id}/topscorers")
 
     addInfo = InfoObj()
     try:
@@ -38,23 +55,11 @@ async def getTopScorers(competition: Competition) -> InfoObj:
             goalStr += f"_Headers: __{i['GoalsScoredByHead']}__ _\n"
             goalStr += f"_Penalties: __{i['GoalsScoredOnPenalty']}__ _\n"
             addInfo[f"{i['Rank']}.: " + i['PlayerInfo']['PlayerName'][0]['Description']] = goalStr
-            lastName = i['PlayerInfo']['PlayerName'][0]['Description'].split(" ")[-1].lower()
-            firstName = i['PlayerInfo']['PlayerName'][0]['Description'].split(" ")[0].lower()
-            imageList = Player.objects.filter(lastName=lastName)
-
-            if len(imageList) != 0:
-                if len(imageList) == 1:
-                    addInfo[f"{i['Rank']}.: " + i['PlayerInfo']['PlayerName'][0]['Description']].set_thumbnail(
-                        url=imageList.first().imageLink)
-                else:
-                    imageList = imageList.filter(firstName=firstName)
-                    if len(imageList) != 0:
-                        addInfo[f"{i['Rank']}.: " + i['PlayerInfo']['PlayerName'][0]['Description']].set_thumbnail(
-                            url=imageList.first().imageLink)
-                    else:
-                        imageList = Player.objects.filter(lastName=lastName)
-                        addInfo[f"{i['Rank']}.: " + i['PlayerInfo']['PlayerName'][0]['Description']].set_thumbnail(
-                            url=imageList.first().imageLink)
+            image = await PlayerLookup.asyncImage(i['PlayerInfo']['PlayerName'][0]['Description'])
+
+            if image is not None:
+                addInfo[f"{i['Rank']}.: " + i['PlayerInfo']['PlayerName'][0]['Description']].set_thumbnail(
+                    url=image)
 
 
         return addInfo
@@ -70,7 +75,7 @@ async def getLeagueTable(competition: Competition) -> str:
     :return: string containing the league in a nicely formatted way
     """
     try:
-        data = makeMiddlewareCall(DataCalls.standings + f"/{competition.id}")
+        data = await asyncMakeMiddlewareCall(DataCalls.standings + f"/{competition.id}")
     except JSONDecodeError:
         return ""
     table = Texttable()
@@ -98,11 +103,11 @@ class PositionMatcher:
     }
 
 
-def getPlayerInfo(playerName: str) -> Tuple[str, InfoObj]:
+async def getPlayerInfo(playerName: str) -> Tuple[str, InfoObj]:
     apiPlayer = playerName.replace(" ", "+")
     try:
         params = {"name": apiPlayer}
-        data = makeAPICall(ApiCalls.playerSearch, payload=params)
+        data = await asyncMakeAPICall(ApiCalls.playerSearch, payload=params)
     except JSONDecodeError:
         return None
 
@@ -118,25 +123,10 @@ def getPlayerInfo(playerName: str) -> Tuple[str, InfoObj]:
 
     id = data['IdPlayer']
     name = data['Name'][0]['Description']
-    lastName = name.split(" ")[-1].lower()
-    firstName = name.split(" ")[0].lower()
-
-    imageList = Player.objects.filter(lastName=lastName)
-    image = None
-
-    if len(imageList) != 0:
-        if len(imageList) == 1:
-            image = imageList.first().imageLink
-        else:
-            imageList = imageList.filter(firstName=firstName)
-            if len(imageList) != 0:
-                image = imageList.first().imageLink
-            else:
-                imageList = Player.objects.filter(lastName=lastName)
-                image = imageList.first().imageLink
+    image = await PlayerLookup.asyncImage(name)
 
     try:
-        data = makeAPICall(ApiCalls.playerInfo + f"/{id}/teams")
+        data = await asyncMakeAPICall(ApiCalls.playerInfo + f"/{id}/teams")
     except JSONDecodeError:
         return None
 
@@ -170,7 +160,7 @@ def getPlayerInfo(playerName: str) -> Tuple[str, InfoObj]:
             retString += f"Contract ran out at {parser.parse(i['LeaveDate']).strftime('%d %b %Y')}\n"
 
         try:
-            teamData = makeAPICall(ApiCalls.specificTeam + f"/{i['IdTeam']}")
+            teamData = await asyncMakeAPICall(ApiCalls.specificTeam + f"/{i['IdTeam']}")
         except JSONDecodeError:
             return None
 
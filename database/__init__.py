@@ -0,0 +1 @@
+import database.pragmas
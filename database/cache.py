@@ -0,0 +1,155 @@
+import logging
+import threading
+from typing import Dict, Union
+
+from database.models import Settings, DiscordUsers
+from database.executor import DBExecutor, DBWriter
+
+logger = logging.getLogger(__name__)
+
+
+class SettingsCache:
+    """
+    In process copy of the Settings table. It is loaded once and kept up to date by writing through it, so reading
+    a setting doesn't need the database. Settings need to be changed with set, otherwise the cache doesn't know
+    about it.
+    """
+    values = None
+    lock = threading.Lock()
+
+    @staticmethod
+    def load() -> Dict[str, str]:
+        values = dict(Settings.objects.values_list('name', 'value'))
+        with SettingsCache.lock:
+            SettingsCache.values = values
+        return values
+
+    @staticmethod
+    def clear():
+        with SettingsCache.lock:
+            SettingsCache.values = None
+
+    @staticmethod
+    def get(name: str, default: str = None) -> Union[str, None]:
+        """
+        Returns a setting, loads the cache if necessary
+        :param name: Name of the setting
+        :param default: Returned if the setting doesn't exist
+        :return: Value of the setting
+        """
+        values = SettingsCache.values
+        if values is None:
+            values = SettingsCache.load()
+        return values.get(name, default)
+
+    @staticmethod
+    async def asyncGet(name: str, default: str = None) -> Union[str, None]:
+        """
+        Awaitable version of get, only the first call needs the database
+        """
+        if SettingsCache.values is None:
+            await DBExecutor.run(SettingsCache.load)
+        return SettingsCache.get(name, default)
+
+    @staticmethod
+    def write(name: str, value: str):
+        Settings.objects.update_or_create(name=name, defaults={'value': value})
+
+    @staticmethod
+    def update(name: str, value: str):
+        with SettingsCache.lock:
+            if SettingsCache.values is not None:
+                SettingsCache.values[name] = value
+
+    @staticmethod
+    def setSync(name: str, value: str):
+        """
+        Blocking version of set, for code running outside of the event loop
+        """
+        DBWriter.write(SettingsCache.write, name, value)
+        SettingsCache.update(name, value)
+
+    @staticmethod
+    async def set(name: str, value: str):
+        """
+        Stores a setting in the database and updates the cache once the write is done
+        :param name: Name of the setting
+        :param value: New value
+        """
+        await DBWriter.run(SettingsCache.write, name, value)
+        SettingsCache.update(name, value)
+
+
+class PermissionCache:
+    """
+    Caches the userlevels of discord users by their id. Unknown users are cached as well (as None), so repeated
+    commands of users without permissions don't hit the database either. After load, all users are known and
+    lookups never need the database. Userlevels need to be changed with set, which updates the cache.
+    """
+    levels = {}
+    complete = False
+    lock = threading.Lock()
+
+    @staticmethod
+    def load() -> int:
+        """
+        Loads the userlevels of all users
+        :return: Number of users
+        """
+        levels = dict(DiscordUsers.objects.values_list('id', 'userLevel'))
+        with PermissionCache.lock:
+            PermissionCache.levels = levels
+            PermissionCache.complete = True
+        return len(levels)
+
+    @staticmethod
+    def clear():
+        with PermissionCache.lock:
+            PermissionCache.levels = {}
+            PermissionCache.complete = False
+
+    @staticmethod
+    def invalidate(userID: int):
+        with PermissionCache.lock:
+            PermissionCache.levels.pop(userID, None)
+            PermissionCache.complete = False
+
+    @staticmethod
+    def cached(userID: int) -> bool:
+        return PermissionCache.complete or userID in PermissionCache.levels
+
+    @staticmethod
+    def lookup(userID: int) -> Union[int, None]:
+        """
+        Returns the userlevel of a user
+        :param userID: Discord id of the user
+        :return: userlevel or None if the user is not stored
+        """
+        if PermissionCache.cached(userID):
+            return PermissionCache.levels.get(userID)
+
+        level = DiscordUsers.objects.filter(id=userID).values_list('userLevel', flat=True).first()
+        with PermissionCache.lock:
+            PermissionCache.levels[userID] = level
+        return level
+
+    @staticmethod
+    async def asyncLookup(userID: int) -> Union[int, None]:
+        """
+        Awaitable version of lookup, only uncached users need the database
+        """
+        if PermissionCache.cached(userID):
+            return PermissionCache.levels.get(userID)
+        return await DBExecutor.run(PermissionCache.lookup, userID)
+
+    @staticmethod
+    async def set(userID: int, name: str, level: int):
+        """
+        Stores the userlevel of a user and updates the cache once the write is done
+        :param userID: Discord id of the user
+        :param name: Name of the user
+        :param level: New userlevel
+        """
+        await DBWriter.run(DiscordUsers(id=userID, name=name, userLevel=level).save)
+        with PermissionCache.lock:
+            PermissionCache.levels[userID] = level
@@ -0,0 +1,257 @@
+import asyncio
+import functools
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable, Dict, Union
+
+from django.db import close_old_connections, connection, transaction
+
+logger = logging.getLogger(__name__)
+
+
+class DBExecutor:
+    """
+    Runs ORM calls outside of the discord event loop. All database work of coroutines is handed to a dedicated,
+    bounded thread pool, so a slow query or write doesn't block the bot. Every worker thread holds its own
+    connection, which is checked before and after each call like Django does for requests. As CONN_MAX_AGE is
+    unlimited, the connection is only replaced if it became unusable.
+    """
+    maxWorkers = 4
+    executor = None
+    lock = threading.Lock()
+    calls = 0
+    pending = 0
+    waitTotal = 0.0
+    waitMax = 0.0
+    runTotal = 0.0
+
+    @staticmethod
+    def get() -> ThreadPoolExecutor:
+        with DBExecutor.lock:
+            if DBExecutor.executor is None:
+                DBExecutor.executor = ThreadPoolExecutor(max_workers=DBExecutor.maxWorkers,
+                                                         thread_name_prefix="db")
+            return DBExecutor.executor
+
+    @staticmethod
+    def shutdown():
+        with DBExecutor.lock:
+            executor = DBExecutor.executor
+            DBExecutor.executor = None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    @staticmethod
+    def execute(submitted: float, func: Callable, *args, **kwargs):
+        """
+        Executes func within a worker thread and records how long it waited in the queue
+        :param submitted: Time the call was submitted
+        :param func: Function doing the ORM work
+        :return: Result of func
+        """
+        started = time.monotonic()
+        with DBExecutor.lock:
+            DBExecutor.pending -= 1
+            DBExecutor.calls += 1
+            DBExecutor.waitTotal += started - submitted
+            DBExecutor.waitMax = max(DBExecutor.waitMax, started - submitted)
+
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+            with DBExecutor.lock:
+                DBExecutor.runTotal += time.monotonic() - started
+
+    @staticmethod
+    async def run(func: Callable, *args, **kwargs):
+        """
+        Awaitable version of func(*args,**kwargs), executed in the database thread pool. Querysets need to be
+        evaluated within func, i.e. by returning a list.
+        :param func: Function doing the ORM work
+        :return: Result of func
+        """
+        with DBExecutor.lock:
+            DBExecutor.pending += 1
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(DBExecutor.get(),
+                                          functools.partial(DBExecutor.execute, time.monotonic(), func,
+                                                            *args, **kwargs))
+
+    @staticmethod
+    def statistics() -> Dict[str, Union[int, str]]:
+        with DBExecutor.lock:
+            calls = DBExecutor.calls
+            return {'calls': calls,
+                    'pending': DBExecutor.pending,
+                    'avgWait': f"{1000 * DBExecutor.waitTotal / calls:.1f}ms" if calls else "0ms",
+                    'maxWait': f"{1000 * DBExecutor.waitMax:.1f}ms",
+                    'avgRun': f"{1000 * DBExecutor.runTotal / calls:.1f}ms" if calls else "0ms"}
+
+
+class WriteRequest:
+    def __init__(self, func: Callable, args: tuple, kwargs: Dict):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+
+
+class DBWriter:
+    """
+    Owns all writes to the database. SQLite only allows a single writer at a time, so instead of competing for the
+    lock, writes are queued and executed by one thread. Writes that are queued at the same time are grouped into a
+    shared transaction, with a savepoint per write, so a failing write only rolls back itself. Reads continue in
+    parallel, as the database runs in WAL mode (see database.pragmas).
+    Until start is called, writes are executed directly by the calling thread.
+    """
+    maxBatch = 100
+    queue = queue.Queue()
+    thread = None
+    lock = threading.Lock()
+    writes = 0
+    batches = 0
+    failed = 0
+    largestBatch = 0
+
+    @staticmethod
+    def start():
+        with DBWriter.lock:
+            if DBWriter.thread is not None:
+                return
+            DBWriter.thread = threading.Thread(target=DBWriter.loop, name="db-writer", daemon=True)
+            DBWriter.thread.start()
+
+    @staticmethod
+    def stop():
+        with DBWriter.lock:
+            thread = DBWriter.thread
+            if thread is None:
+                return
+            DBWriter.queue.put(None)
+        thread.join()
+        with DBWriter.lock:
+            DBWriter.thread = None
+
+    @staticmethod
+    def running() -> bool:
+        return DBWriter.thread is not None
+
+    @staticmethod
+    def loop():
+        logger.info("Database writer started")
+        try:
+            while True:
+                requests = [DBWriter.queue.get()]
+                while requests[-1] is not None and len(requests) < DBWriter.maxBatch:
+                    try:
+                        requests.append(DBWriter.queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+                stop = requests[-1] is None
+                requests = [i for i in requests if i is not None]
+                if len(requests) != 0:
+                    DBWriter.executeBatch(requests)
+                if stop:
+                    return
+        finally:
+            connection.close()
+            logger.info("Database writer stopped")
+
+    @staticmethod
+    def executeBatch(requests: list):
+        """
+        Executes the given writes within one transaction, each of them within its own savepoint
+        :param requests: List of WriteRequest objects
+        """
+        close_old_connections()
+        results = []
+        try:
+            with transaction.atomic():
+                for request in requests:
+                    try:
+                        with transaction.atomic():
+                            results.append((request, request.func(*request.args, **request.kwargs), None))
+                    except Exception as e:
+                        results.append((request, None, e))
+        except Exception as e:
+            logger.error(f"Failed to commit {len(requests)} writes: {e.__class__.__name__} : {e}")
+            results = [(request, None, e) for request in requests]
+
+        with DBWriter.lock:
+            DBWriter.batches += 1
+            DBWriter.writes += len(requests)
+            DBWriter.failed += len([i for i in results if i[2] is not None])
+            DBWriter.largestBatch = max(DBWriter.largestBatch, len(requests))
+
+        for request, result, error in results:
+            if error is None:
+                request.future.set_result(result)
+            else:
+                request.future.set_exception(error)
+        close_old_connections()
+
+    @staticmethod
+    def submit(func: Callable, *args, **kwargs) -> Future:
+        """
+        Queues func(*args,**kwargs) for the writer. If the writer is not running or the caller is the writer
+        itself, func is executed directly within a transaction.
+        :param func: Function doing the write
+        :return: Future containing the result of func
+        """
+        request = WriteRequest(func, args, kwargs)
+        thread = DBWriter.thread
+        if thread is None or thread is threading.current_thread():
+            try:
+                with transaction.atomic():
+                    request.future.set_result(func(*args, **kwargs))
+            except Exception as e:
+                request.future.set_exception(e)
+        else:
+            DBWriter.queue.put(request)
+        return request.future
+
+    @staticmethod
+    def write(func: Callable, *args, **kwargs):
+        """
+        Blocking version of submit, for code running outside of the event loop
+        :param func: Function doing the write
+        :return: Result of func
+        """
+        return DBWriter.submit(func, *args, **kwargs).result()
+
+    @staticmethod
+    async def run(func: Callable, *args, **kwargs):
+        """
+        Awaitable version of submit
+        :param func: Function doing the write
+        :return: Result of func
+        """
+        return await asyncio.wrap_future(DBWriter.submit(func, *args, **kwargs))
+
+    @staticmethod
+    def statistics() -> Dict[str, int]:
+        with DBWriter.lock:
+            return {'writes': DBWriter.writes,
+                    'batches': DBWriter.batches,
+                    'largestBatch': DBWriter.largestBatch,
+                    'failed': DBWriter.failed,
+                    'queued': DBWriter.queue.qsize()}
+
+
+def asyncDB(func: Callable) -> Callable:
+    """
+    Decorator creating a coroutine version of a function doing ORM work. See DBExecutor
+    :param func: Function doing the ORM work
+    :return: Coroutine function
+    """
+    @functools.wraps(func)
+    async def func_wrapper(*args, **kwargs):
+        return await DBExecutor.run(func, *args, **kwargs)
+
+    return func_wrapper
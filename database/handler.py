@@ -1,20 +1,31 @@
-from django.db.utils import IntegrityError
+from django.db.utils import IntegrityError,DatabaseError
+from django.db import transaction
 from datetime import timedelta,timezone,datetime
 import logging
 import enum
-from typing import List,Dict,Union
+from collections import OrderedDict
+from typing import List,Dict,Union,Tuple
 from pytz import utc,UTC
 import asyncio
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from json.decoder import JSONDecodeError
 from django.core.exceptions import ObjectDoesNotExist
+from requests import RequestException
 
 from api.calls import getSpecificTeam,getAllFederations,getAllCountries\
-    ,getAllCompetitions,getAllMatches,getAllSeasons,getAllPlayerInfo
-from database.models import Federation,Competition,CompetitionWatcher,Season,Match,Settings,Player
+    ,getAllCompetitions,getAllMatches,getAllSeasons,getAllPlayerInfo,iterPlayerInfo,Fingerprints,SyncTracker
+from database.models import Federation,Competition,CompetitionWatcher,Season,Match,Settings,Player,Team
+from database.executor import DBWriter
+from database.players import PlayerLookup,PlayerIndexFile
+from database.cache import SettingsCache
 from discord_handler.liveMatch import LiveMatch
 from discord_handler.client import toDiscordChannelName,client
 
 logger = logging.getLogger(__name__)
 
+#errors of a single api call, see syncParallel
+fetchErrors = (RequestException, KeyError, TypeError, JSONDecodeError)
+
 class MatchStatus(enum.Enum):
     """
     Status as defined by Fifa API
@@ -28,6 +39,51 @@ class MatchStatus(enum.Enum):
     Cancelled = 8
     Suspended = 99
 
+class MatchSync:
+    """
+    Keeps track of the match synchronization. Usually only matches within a window around now are fetched
+    (delta sync), a full resync of a season happens once per fullSyncInterval or on demand.
+    """
+    windowPast = timedelta(days=2)
+    windowFuture = timedelta(days=14)
+    fullSyncInterval = timedelta(days=7)
+    lastFullSync = {}
+
+    @staticmethod
+    def needsFullSync(seasonID : int) -> bool:
+        lastSync = MatchSync.lastFullSync.get(seasonID)
+        return lastSync is None or datetime.utcnow() - lastSync > MatchSync.fullSyncInterval
+
+    @staticmethod
+    def job(competitionID : int, seasonID : int, full : bool = None) -> Tuple[callable, Dict]:
+        """
+        Returns the getAllMatches call for a season, either for the whole season or only for the delta window.
+        :param competitionID: ID of the competition
+        :param seasonID: ID of the season
+        :param full: Forces a full (True) or delta (False) sync. If None, a full sync is done if it is due
+        :return: Function and kwargs, see syncParallel
+        """
+        if full is None:
+            full = MatchSync.needsFullSync(seasonID)
+        kwargs = {'idCompetitions': competitionID, 'idSeason': seasonID}
+        if not full:
+            #rounded to the hour, so calls within the same hour share the ResponseCache
+            now = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+            kwargs['fromDate'] = now - MatchSync.windowPast
+            kwargs['toDate'] = now + MatchSync.windowFuture
+        return getAllMatches, kwargs
+
+    @staticmethod
+    def run(jobList : List[Tuple[callable, Dict]]):
+        """
+        Executes the given jobs and remembers the successful full syncs.
+        :param jobList: Jobs created by job
+        """
+        failed = syncParallel(jobList)
+        for func, kwargs in jobList:
+            if 'fromDate' not in kwargs.keys() and (func, kwargs) not in failed:
+                MatchSync.lastFullSync[kwargs['idSeason']] = datetime.utcnow()
+
 class MatchDayObject:
     """
     Matchday object, representing the necessary data for Matchdays
@@ -44,77 +100,255 @@ def getAndSaveData(func : callable, **kwargs):
     :param func: Function to be executed and read from
     :param kwargs: parameters to the function, created as kwargs
     """
-    data = func(**kwargs)
-
-    cnt = 1
-    length = len(data)
-    if data[0]._meta.label == 'database.Player':
-        logger.info(f"Saving {data[0]._meta.label}. This may take a while")
-        type(data[0]).objects.bulk_create(data)
+    if func == getAllPlayerInfo:
+        importPlayerInfo()
         return
 
-    for i in data:
-        try:
-            if data[0]._meta.label == 'database.Match':
-                if cnt %100 == 0:
-                    logger.debug(f"{cnt}/{length}: Saving {func.__name__}: {i}")
-            else:
-                logger.debug(f"{cnt}/{length}: Saving {func.__name__}: {i}")
-            i.save()
-
-        except IntegrityError:
-            if i._meta.label == 'database.Match':
-                try:
-                    home_team = getSpecificTeam(i.home_team_id)
-                    away_team = getSpecificTeam(i.away_team_id)
-                    home_team.save()
-                    away_team.save()
-                    i.save()
-                except NameError:
-                    pass
-            elif i._meta.label == 'database.Competition':
-                logger.warning(f"{i.association_id} has no country! Will not save country")
+    data, tracker = Fingerprints.fetch(func, kwargs)
+    saveData(func, data, tracker)
+
+def saveData(func : callable, data : List, tracker : SyncTracker = None) -> Dict[str,int]:
+    """
+    Stores the result of a getAll function to the DB. See getAndSaveData. Objects are compared to the stored
+    ones and only new or changed objects are written, all within one transaction. Teams that are missing for
+    matches are fetched beforehand, competitions without a known country are skipped.
+    :param func: Function that returned the data
+    :param data: Result of func
+    :param tracker: Fingerprints of data, committed once the data is stored
+    :return: Number of inserted, updated and unchanged objects
+    """
+    if len(data) == 0:
+        if tracker is not None:
+            tracker.commit()
+        return {'inserted': 0, 'updated': 0, 'unchanged': 0}
+
+    model = type(data[0])
+    if model == Match:
+        resolveMissingTeams(data)
+
+    savedData = removeMissingForeignKeys(model, data)
+    result = DBWriter.write(bulkUpsert, model, savedData)
+    if tracker is not None:
+        tracker.commit(set([i.pk for i in data]) - set([i.pk for i in savedData]))
+    logger.info(f"Saved {model._meta.label} from {func.__name__}: {result}")
+    return result
+
+def removeMissingForeignKeys(model, objList : List) -> List:
+    """
+    Checks all foreign keys of the given objects against the database. Competitions without a country and
+    matches with unknown teams are skipped, for all other models an IntegrityError is raised.
+    :param model: Model of the objects
+    :param objList: Objects that are about to be saved
+    :return: Objects that can be saved
+    """
+    for field in model._meta.concrete_fields:
+        if not field.is_relation:
+            continue
+        missingIDs = set([getattr(i, field.attname) for i in objList]) - {None}
+        missingIDs -= existingIDs(field.related_model, missingIDs)
+        if len(missingIDs) == 0:
+            continue
+
+        if model == Competition:
+            logger.warning(f"{missingIDs} have no country! Will not save these competitions")
+        elif model == Match:
+            logger.warning(f"Teams {missingIDs} are not available! Will not save their matches")
+        else:
+            raise IntegrityError(f"Foreign Key constraint failed for {model._meta.label}")
+        objList = [i for i in objList if getattr(i, field.attname) not in missingIDs]
+    return objList
+
+def bulkUpsert(model, objList : List, batchSize : int = 500) -> Dict[str,int]:
+    """
+    Inserts or updates the given objects. The objects are compared with the stored ones by their primary keys:
+    new objects are inserted with bulk_create, changed objects are updated and unchanged objects are left
+    alone. Everything happens within one transaction.
+    :param model: Model of the objects
+    :param objList: Objects to be stored
+    :param batchSize: Number of objects handled at once
+    :return: Number of inserted, updated and unchanged objects
+    """
+    fields = [i for i in model._meta.concrete_fields if not i.primary_key]
+    objDict = OrderedDict([(i.pk, i) for i in objList])
+    idList = list(objDict.keys())
+    result = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+
+    with transaction.atomic():
+        for index in range(0, len(idList), batchSize):
+            batchIDs = idList[index:index + batchSize]
+            stored = model.objects.in_bulk(batchIDs)
+            newObjects = []
+            changedObjects = []
+            changedFields = set()
+            for pk in batchIDs:
+                obj = objDict[pk]
+                if pk not in stored:
+                    newObjects.append(obj)
+                    continue
+
+                changed = [i.attname for i in fields
+                           if i.to_python(getattr(obj, i.attname)) != getattr(stored[pk], i.attname)]
+                if len(changed) == 0:
+                    result['unchanged'] += 1
+                    continue
+
+                changedObjects.append(obj)
+                changedFields.update(changed)
+                if not hasattr(model.objects, 'bulk_update'):
+                    model.objects.filter(pk=pk).update(**dict([(i, getattr(obj, i)) for i in changed]))
+
+            if len(changedObjects) != 0 and hasattr(model.objects, 'bulk_update'):
+                model.objects.bulk_update(changedObjects, list(changedFields))
+            model.objects.bulk_create(newObjects)
+            result['inserted'] += len(newObjects)
+            result['updated'] += len(changedObjects)
+    return result
+
+def syncParallel(jobList : List[Tuple[callable, Dict]], maxWorkers : int = 4) -> List[Tuple[callable, Dict]]:
+    """
+    Parallel version of getAndSaveData for multiple calls. The getAll functions are executed concurrently in a
+    bounded thread pool, while the results are stored to the DB by the calling thread as soon as they arrive. This
+    way the network latencies overlap, but there is still only a single writer for the database. A job failing to
+    fetch or to store its data is logged and doesn't affect the other jobs.
+    :param jobList: List of getAll functions with the kwargs they are called with
+    :param maxWorkers: Maximum number of concurrent fetches
+    :return: Jobs that failed
+    """
+    failed = []
+    if len(jobList) == 0:
+        return failed
+
+    logger.info(f"Syncing {len(jobList)} calls with {maxWorkers} workers")
+    with ThreadPoolExecutor(max_workers=maxWorkers) as executor:
+        futures = dict([(executor.submit(Fingerprints.fetch, func, kwargs), (func, kwargs))
+                        for func, kwargs in jobList])
+        for future in as_completed(futures):
+            func, kwargs = futures[future]
+            try:
+                data, tracker = future.result()
+                saveData(func, data, tracker)
+            except fetchErrors + (DatabaseError,) as e:
+                logger.error(f"Failed to sync {func.__name__} with {kwargs}: {e.__class__.__name__} : {e}")
+                failed.append((func, kwargs))
+    return failed
+
+def resolveMissingTeams(matchList : List[Match], maxWorkers : int = 8) -> int:
+    """
+    Collects all teams of the given matches that are not yet in the database, fetches them concurrently from the
+    API and stores them at once. This way the matches can be saved afterwards without running into
+    ForeignKeyErrors one by one.
+    :param matchList: Matches that are about to be saved
+    :param maxWorkers: Maximum number of teams fetched at the same time
+    :return: Number of stored teams
+    """
+    teamIDs = set()
+    for match in matchList:
+        teamIDs.update([match.home_team_id, match.away_team_id])
+    teamIDs.discard(None)
+
+    missingIDs = teamIDs - existingIDs(Team, teamIDs)
+    if len(missingIDs) == 0:
+        return 0
+
+    logger.info(f"Fetching {len(missingIDs)} missing teams")
+    teams = {}
+    with ThreadPoolExecutor(max_workers=maxWorkers) as executor:
+        futures = {executor.submit(getSpecificTeam, teamID): teamID for teamID in missingIDs}
+        for future in as_completed(futures):
+            try:
+                team = future.result()
+            except fetchErrors as e:
+                logger.warning(f"Failed to fetch team {futures[future]}: {e.__class__.__name__}")
                 continue
-            else:
-                raise IntegrityError(f"Foreign Key constraint failed for {i._meta.label}")
+            teams[team.id] = team
+
+    def storeTeams():
+        storedIDs = existingIDs(Team, teams.keys())
+        newTeams = [team for teamID,team in teams.items() if teamID not in storedIDs]
+        Team.objects.bulk_create(newTeams)
+        return len(newTeams)
 
-        cnt += 1
+    return DBWriter.write(storeTeams)
+
+def existingIDs(model, idList, chunkSize : int = 500) -> set:
+    """
+    Returns the subset of idList that is already stored for model. The lookup is split into chunks, as SQLite
+    limits the number of variables per query.
+    """
+    idList = list(idList)
+    result = set()
+    for i in range(0, len(idList), chunkSize):
+        result.update(model.objects.filter(pk__in=idList[i:i + chunkSize]).values_list('pk', flat=True))
+    return result
+
+def importPlayerInfo(batchSize : int = 2000) -> int:
+    """
+    Streams the player image database into the Player table. Players are written in batches of batchSize, each
+    batch within its own transaction, so memory usage doesn't grow with the size of the database. Players of a
+    previous import are removed first. The playerImport setting is only set to done after the last batch, so an
+    interrupted import is repeated by updateOverlayData.
+    :param batchSize: Number of players written at once
+    :return: Number of imported players
+    """
+    logger.info("Importing player data. This may take a while")
+    SettingsCache.setSync('playerImport', "started")
+    DBWriter.write(Player.objects.all().delete)
+    count = 0
+    batch = []
+    for player in iterPlayerInfo():
+        batch.append(player)
+        if len(batch) >= batchSize:
+            DBWriter.write(Player.objects.bulk_create, batch)
+            count += len(batch)
+            batch = []
+            logger.info(f"Imported {count} players")
+
+    if len(batch) != 0:
+        DBWriter.write(Player.objects.bulk_create, batch)
+        count += len(batch)
+
+    SettingsCache.setSync('playerImport', "done")
+    PlayerIndexFile.newGeneration()
+    logger.info(f"Player import done, {count} players imported")
+    PlayerLookup.load()
+    return count
 
 def updateOverlayData():
     """
     The relevant overlay data (Federations, Countries, Competitions and watched seasons) is refreshed from the API.
     """
     logger.info("Updating competitions")
-    if len(Player.objects.all()) == 0:
-        getAndSaveData(getAllPlayerInfo)
-    getAndSaveData(getAllFederations)
-    getAndSaveData(getAllCountries)
-    for federation in Federation.objects.all():
-        getAndSaveData(getAllCompetitions, idFederation=federation.id)
+    if SettingsCache.get('playerImport') != "done":
+        importPlayerInfo()
+    syncParallel([(getAllFederations, {}), (getAllCountries, {})])
+    syncParallel([(getAllCompetitions, {'idFederation': federation.id}) for federation in Federation.objects.all()])
+    syncParallel([(getAllSeasons, {'idCompetitions': watcher.competition_id})
+                  for watcher in CompetitionWatcher.objects.all()])
 
-    for watcher in CompetitionWatcher.objects.all():
-        getAndSaveData(getAllSeasons, idCompetitions=watcher.competition.id)
-
-def updateMatches():
+def updateMatches(full : bool = None):
     """
-    Update the data for the matches stored as monitored in the database from the API.
+    Update the data for the matches stored as monitored in the database from the API. See MatchSync.
+    :param full: Forces a full (True) or delta (False) sync, by default a full sync is done once a week
     """
     logger.info("Updating matches")
-    for watcher in CompetitionWatcher.objects.all():
+    jobList = []
+    for watcher in CompetitionWatcher.objects.select_related('competition').all():
         for season in Season.objects.filter(competition=watcher.competition):
             logger.debug(f"Competition: {str(watcher.competition.clear_name.encode('utf-8'))}"
                          f",Season: {season.clear_name.encode('utf-8')}")
-            updateMatchesSingleCompetition(competition=watcher.competition, season=season)
+            jobList.append(MatchSync.job(watcher.competition_id, season.id, full))
+    MatchSync.run(jobList)
 
-def updateMatchesSingleCompetition(competition : Competition, season : Season):
+def updateMatchesSingleCompetition(competition : Competition, season : Season, full : bool = None):
     """
-    Updates a single full competition. This reads all relevant matches of the given competition and season and stores
-    it in the database
+    Updates a single competition. This reads all relevant matches of the given competition and season and stores
+    it in the database. See MatchSync.
     :param competition: The relevant competition object from database.models
     :param season: The relevant season object from database.models
+    :param full: Forces a full (True) or delta (False) sync, by default a full sync is done once a week
     """
     logger.info(f"Updating {competition.clear_name}, season {season.clear_name}")
-    getAndSaveData(getAllMatches, idCompetitions=competition.id, idSeason=season.id)
+    MatchSync.run([MatchSync.job(competition.id, season.id, full)])
 
 def createMatchDayObject(query,watcher):
     """
@@ -131,7 +365,7 @@ def createMatchDayObject(query,watcher):
         matchdayString = f"{watcher.competition.clear_name} Matchday {query.first().matchday}"
     )
 
-def compDict(competition : CompetitionWatcher) ->Dict[str,Dict[str,Union[List[LiveMatch],str]]]:
+def compDict(competition : CompetitionWatcher, category : str = None) ->Dict[str,Dict[str,Union[List[LiveMatch],str]]]:
     """
     Creates Matchday objects that in turn are used by the Scheduler to check which and where
     matches should be created. This function assumes that all relevant matches are already in the
@@ -148,46 +382,56 @@ def compDict(competition : CompetitionWatcher) ->Dict[str,Dict[str,Union[List[Li
     a single match). See the class docu for further explanation there. passedMatches are Matches that are already
     passed from the point at this function is called, upcomingMatches are the upcoming ones and currentMatches are the
     currently running ones.
+    All matches of the current season are read with a single query and grouped by their matchday.
     :param competition: The competition for which you want to add the games.
+    :param category: Default category, used if the competition has none. Read from the settings if not given
     :return:
     """
     comp_name = competition.competition.clear_name
-    matchDict = {}
-    matchDayList = competition.current_season.match_set.values_list('matchday', flat=True).distinct()
-    for md in matchDayList:
-        matchDict[md] = {}
-        matchList = Match.objects.filter(matchday=md).filter(competition=competition.competition) \
-            .filter(season=competition.current_season).order_by('date')
-        passedTime = (datetime.utcnow() - timedelta(hours=3)).replace(tzinfo=UTC)
-        upcomingTime = (datetime.utcnow() + timedelta(hours=3)).replace(tzinfo=UTC)
-
-        matchDict[md]['start'] = (matchList.first().date - timedelta(hours=1)).replace(tzinfo=UTC)
-        matchDict[md]['end'] = (matchList.last().date + timedelta(hours=3)).replace(tzinfo=UTC)
-        if competition.unified_channel == None:
-            matchDict[md]['channel_name'] = toDiscordChannelName(f"live-{comp_name}")
-            matchDict[md]['custom_channel'] = False
-        else:
-            matchDict[md]['channel_name'] = toDiscordChannelName(competition.unified_channel)
-            matchDict[md]['custom_channel'] = True
+    if competition.unified_channel == None:
+        channelName = toDiscordChannelName(f"live-{comp_name}")
+        customChannel = False
+    else:
+        channelName = toDiscordChannelName(competition.unified_channel)
+        customChannel = True
 
-        if competition.category is None:
-            try:
-                settings = Settings.objects.get(name='defaultCategory')
-                category =settings.value
-            except ObjectDoesNotExist:
-                category = None
-        else:
-            category = competition.category
+    if competition.category is None:
+        category = defaultCategory() if category is None else category
+    else:
+        category = competition.category
 
+    matchList = Match.objects.filter(competition_id=competition.competition_id) \
+        .filter(season_id=competition.current_season_id).select_related('competition', 'home_team', 'away_team') \
+        .order_by('matchday', 'date')
+    matchDays = OrderedDict()
+    for match in matchList:
+        matchDays.setdefault(match.matchday, []).append(match)
+
+    passedTime = (datetime.utcnow() - timedelta(hours=3)).replace(tzinfo=UTC)
+    upcomingTime = (datetime.utcnow() + timedelta(hours=3)).replace(tzinfo=UTC)
+    matchDict = {}
+    for md, matches in matchDays.items():
+        matchDict[md] = {}
+        matchDict[md]['start'] = (matches[0].date - timedelta(hours=1)).replace(tzinfo=UTC)
+        matchDict[md]['end'] = (matches[-1].date + timedelta(hours=3)).replace(tzinfo=UTC)
+        matchDict[md]['channel_name'] = channelName
+        matchDict[md]['custom_channel'] = customChannel
         matchDict[md]['category'] = category
         matchDict[md]['role'] = competition.role
         matchDict[md]['channel_created'] = False
-        matchDict[md]['passedMatches'] = [LiveMatch(obj,matchDict[md]['channel_name']) for obj in matchList.filter(date__lt=passedTime)]
-        matchDict[md]['currentMatches'] = [LiveMatch(obj,matchDict[md]['channel_name']) for obj in matchList.filter(date__gt=passedTime)
-                                                           .filter(date__lt=upcomingTime)]
-        matchDict[md]['upcomingMatches'] = [LiveMatch(obj,matchDict[md]['channel_name']) for obj in matchList.filter(date__gt=upcomingTime)]
+        matchDict[md]['passedMatches'] = [LiveMatch(obj,channelName) for obj in matches if obj.date < passedTime]
+        matchDict[md]['currentMatches'] = [LiveMatch(obj,channelName) for obj in matches
+                                           if passedTime < obj.date < upcomingTime]
+        matchDict[md]['upcomingMatches'] = [LiveMatch(obj,channelName) for obj in matches if obj.date > upcomingTime]
     return matchDict
 
+def defaultCategory() -> Union[str,None]:
+    """
+    Returns the default category for channels created by competitions
+    :return: Name of the category or None if it isn't set
+    """
+    return SettingsCache.get('defaultCategory')
+
 def getNextMatchDayObjects() -> Dict[str,Dict[str,Dict]]:
     """
     Returns all Matchday objects for the current season for all competitions monitored by
@@ -195,25 +439,7 @@ def getNextMatchDayObjects() -> Dict[str,Dict[str,Dict]]:
     :return: List of Matchday Objects
     """
     matchDict = {}
-    for competition in CompetitionWatcher.objects.all():
-        matchDict[competition.competition.clear_name] = compDict(competition)
+    category = defaultCategory()
+    for competition in CompetitionWatcher.objects.select_related('competition').all():
+        matchDict[competition.competition.clear_name] = compDict(competition, category)
     return matchDict
-
-
-
-def getCurrentMatches() -> List[Match]:
-    """
-    Returns a list of matches that are currently or soon played
-    :return:
-    """
-    retList = []
-
-    for i in CompetitionWatcher.objects.all():
-        updateMatchesSingleCompetition(i.competition,i.current_season)
-        queryLive = Match.objects.filter(competition=i.competition).filter(match_status=MatchStatus.Live.value)
-        queryLineups = Match.objects.filter(competition=i.competition).filter(match_status=MatchStatus.LineUps.value)
-        retList +=  queryLive | queryLineups
-    return retList
-
-
-
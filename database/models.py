@@ -44,6 +44,11 @@ class Competition(models.Model):
     clear_name = models.CharField(max_length=255, verbose_name="Full name of the competition")
     association = models.ForeignKey(Association, on_delete=models.CASCADE, verbose_name="Country of competition")
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['clear_name'], name='competition_name_idx'),
+        ]
+
     def __str__(self):
         return f"ID: {self.id}, Clear_Name: {self.clear_name.encode('utf-8')},Association {self.association_id}"
 
@@ -89,6 +94,12 @@ class Match(models.Model):
     score_away_team = models.IntegerField(verbose_name="Score for the away team", null=True)
     passed = models.BooleanField(verbose_name="Flag if the match is allready passed", default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['competition', 'season', 'matchday', 'date'], name='match_matchday_idx'),
+            models.Index(fields=['match_status'], name='match_status_idx'),
+        ]
+
     def __str__(self):
         return f"ID: {self.id}, HomeTeam: {self.home_team.clear_name}, " \
                f"AwayTeam: {self.away_team.clear_name}, matchday: {self.matchday}," \
@@ -128,11 +139,21 @@ class Goal(models.Model):
     minute = models.CharField(max_length=10,verbose_name="Minute this happened")
     link = models.URLField(verbose_name="Link to the goal")
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['player'], name='goal_player_idx'),
+        ]
+
 class Player(models.Model):
     firstName = models.CharField(max_length=255,verbose_name=" First name of the player")
     lastName = models.CharField(max_length=255,verbose_name="Last name of the player")
     birthDate = models.CharField(max_length=12, verbose_name="Birth date of the player")
     imageLink = models.URLField(max_length=255,verbose_name="Link to the image of the player")
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['lastName', 'firstName'], name='player_name_idx'),
+        ]
+
     def __str__(self):
         return f"Player {self.firstName} {self.lastName}"
\ No newline at end of file
@@ -0,0 +1,303 @@
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from typing import Dict, Tuple, Union
+
+from django.conf import settings
+
+from database.models import Player
+from database.executor import DBExecutor
+from database.cache import SettingsCache
+from api.calls import normaliseFirstName, normaliseLastName
+
+logger = logging.getLogger(__name__)
+
+
+class PlayerIndexFile:
+    """
+    Compact binary version of the player index, used through mmap. The file consists of a header, a sorted array of
+    records and a blob containing the image links. Every record holds the 8 byte blake2b hashes of a last and a
+    first name, and offset and length of the image within the blob. Each last name has a default record with a
+    first name hash of 0, pointing to the first stored player with this last name, and if the last name is not
+    unique, one record per first name. Lookups are binary searches on the mapped file, so nothing needs to be
+    loaded and several processes share the pages through the OS cache. The header stores the generation of the
+    Player table the file was built from, so the file is rebuilt after the next player import.
+    """
+    fileName = "player_index.bin"
+    directory = None
+    magic = b"SBPI"
+    version = 3
+    header = struct.Struct("<4sIIIQ")
+    record = struct.Struct("<QQII")
+    key = struct.Struct("<QQ")
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map)
+        magic, version, self.playerCount, self.recordCount, self.generation = \
+            PlayerIndexFile.header.unpack_from(self.view, 0)
+        if magic != PlayerIndexFile.magic or version != PlayerIndexFile.version:
+            self.close()
+            raise ValueError(f"{path} is not a player index of version {PlayerIndexFile.version}")
+        self.path = path
+        self.blobStart = PlayerIndexFile.header.size + self.recordCount * PlayerIndexFile.record.size
+
+    @staticmethod
+    def enable(directory: str = None):
+        """
+        Enables the index file. Without a directory, the file is stored next to the database.
+        :param directory: Directory of the index file
+        """
+        if directory is None:
+            directory = os.path.dirname(str(settings.DATABASES['default']['NAME']))
+        PlayerIndexFile.directory = directory
+
+    @staticmethod
+    def disable():
+        PlayerIndexFile.directory = None
+
+    @staticmethod
+    def enabled() -> bool:
+        return PlayerIndexFile.directory is not None
+
+    @staticmethod
+    def path() -> str:
+        return os.path.join(PlayerIndexFile.directory, PlayerIndexFile.fileName)
+
+    @staticmethod
+    def hash(name: str) -> int:
+        return int.from_bytes(hashlib.blake2b(name.encode(), digest_size=8).digest(), 'little')
+
+    @staticmethod
+    def generation() -> int:
+        """
+        Returns the generation of the Player table, see newGeneration
+        """
+        return int(SettingsCache.get('playerGeneration', "0"))
+
+    @staticmethod
+    def newGeneration():
+        """
+        Marks the Player table as changed, index files built before are rebuilt with the next load. Called after
+        every player import.
+        """
+        SettingsCache.setSync('playerGeneration', str(int(time.time() * 1e6)))
+
+    @staticmethod
+    def build(path: str = None) -> int:
+        """
+        Compiles the Player table into an index file. The file is written next to the target and moved in place
+        afterwards, so open indices stay valid.
+        :param path: Target file, by default see path
+        :return: Number of indexed players
+        """
+        path = PlayerIndexFile.path() if path is None else path
+        records = {}
+        blob = bytearray()
+        blobOffsets = {}
+        playerCount = 0
+        generation = PlayerIndexFile.generation()
+        for lastName, firstName, imageLink in Player.objects.order_by('id') \
+                .values_list('lastName', 'firstName', 'imageLink').iterator():
+            playerCount += 1
+            if imageLink not in blobOffsets:
+                encoded = imageLink.encode()
+                blobOffsets[imageLink] = (len(blob), len(encoded))
+                blob += encoded
+            lastHash = PlayerIndexFile.hash(lastName)
+            records.setdefault((lastHash, 0), blobOffsets[imageLink])
+            records.setdefault((lastHash, PlayerIndexFile.hash(firstName) or 1), blobOffsets[imageLink])
+
+        # unique last names only need their default record
+        counts = {}
+        for lastHash, firstHash in records.keys():
+            counts[lastHash] = counts.get(lastHash, 0) + 1
+        recordList = sorted([(key, val) for key, val in records.items() if counts[key[0]] > 2 or key[1] == 0])
+
+        tmpPath = path + ".tmp"
+        with open(tmpPath, "wb") as f:
+            f.write(PlayerIndexFile.header.pack(PlayerIndexFile.magic, PlayerIndexFile.version, playerCount,
+                                                len(recordList), generation))
+            for (lastHash, firstHash), (offset, length) in recordList:
+                f.write(PlayerIndexFile.record.pack(lastHash, firstHash, offset, length))
+            f.write(blob)
+        os.replace(tmpPath, path)
+        logger.info(f"Player index file with {playerCount} players written to {path}")
+        return playerCount
+
+    def close(self):
+        self.view.release()
+        self.map.close()
+
+    def lowerBound(self, key: Tuple[int, int]) -> int:
+        low, high = 0, self.recordCount
+        while low < high:
+            mid = (low + high) // 2
+            if PlayerIndexFile.key.unpack_from(self.view, PlayerIndexFile.header.size
+                                               + mid * PlayerIndexFile.record.size) < key:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def image(self, index: int) -> str:
+        _, _, offset, length = PlayerIndexFile.record.unpack_from(self.view, PlayerIndexFile.header.size
+                                                                  + index * PlayerIndexFile.record.size)
+        return bytes(self.view[self.blobStart + offset:self.blobStart + offset + length]).decode()
+
+    def matches(self, index: int, key: Tuple[int, int]) -> bool:
+        return index < self.recordCount and PlayerIndexFile.key.unpack_from(
+            self.view, PlayerIndexFile.header.size + index * PlayerIndexFile.record.size) == key
+
+    def find(self, lastName: str, firstName: str) -> Union[str, None]:
+        """
+        Same as PlayerLookup.find, answered from the file
+        """
+        lastHash = PlayerIndexFile.hash(lastName)
+        default = self.lowerBound((lastHash, 0))
+        if not self.matches(default, (lastHash, 0)):
+            return None
+
+        key = (lastHash, PlayerIndexFile.hash(firstName) or 1)
+        index = self.lowerBound(key)
+        return self.image(index if self.matches(index, key) else default)
+
+
+class PlayerLookup:
+    """
+    In memory index of the player images. All players are loaded once into a dict keyed by their normalised last
+    name. Unique last names map to a tuple of first name and image, otherwise to a dict of first names and images,
+    with the image of the first stored player under None. Lookups follow the same rules as the queries did before:
+    a unique last name wins, otherwise the first name decides, otherwise the first player with that last name.
+    If the PlayerIndexFile is enabled, the mapped file is used instead of the dict.
+    """
+    index = None
+    lock = threading.Lock()
+
+    @staticmethod
+    def splitName(playerName: str) -> Tuple[str, str]:
+        """
+        Splits a full player name into its normalised last and first name
+        :param playerName: Name of the player, i.e. "Thomas Müller"
+        :return: Tuple of last and first name
+        """
+        return normaliseLastName(playerName.split(" ")[-1]), normaliseFirstName(playerName.split(" ")[0])
+
+    @staticmethod
+    def load() -> int:
+        """
+        (Re)loads the index from the database, or opens the index file if it is enabled
+        :return: Number of indexed players
+        """
+        if PlayerIndexFile.enabled():
+            return PlayerLookup.loadFile()
+
+        index = {}
+        count = 0
+        for lastName, firstName, imageLink in Player.objects.order_by('id') \
+                .values_list('lastName', 'firstName', 'imageLink').iterator():
+            firstName = sys.intern(firstName)
+            entry = index.get(lastName)
+            if entry is None:
+                index[lastName] = (firstName, imageLink)
+            elif isinstance(entry, tuple):
+                index[lastName] = {None: entry[1], entry[0]: entry[1]}
+                index[lastName].setdefault(firstName, imageLink)
+            else:
+                entry.setdefault(firstName, imageLink)
+            count += 1
+
+        PlayerLookup.swap(index)
+        logger.info(f"Player lookup loaded with {count} players")
+        return count
+
+    @staticmethod
+    def loadFile() -> int:
+        """
+        Opens the index file. It is (re)built if it doesn't exist or was built from another generation of the
+        Player table.
+        :return: Number of indexed players
+        """
+        try:
+            indexFile = PlayerIndexFile(PlayerIndexFile.path())
+            if indexFile.generation != PlayerIndexFile.generation():
+                indexFile.close()
+                indexFile = None
+        except (FileNotFoundError, ValueError):
+            indexFile = None
+
+        if indexFile is None:
+            PlayerIndexFile.build()
+            indexFile = PlayerIndexFile(PlayerIndexFile.path())
+
+        PlayerLookup.swap(indexFile)
+        logger.info(f"Player lookup uses {indexFile.path} with {indexFile.playerCount} players")
+        return indexFile.playerCount
+
+    @staticmethod
+    def swap(index: Union[Dict, PlayerIndexFile]):
+        """
+        Replaces the index. A previously mapped index file isn't closed, as other threads may still be looking up
+        players in it; the map is released once the last reference is gone.
+        """
+        with PlayerLookup.lock:
+            PlayerLookup.index = index
+
+    @staticmethod
+    def loaded() -> bool:
+        return PlayerLookup.index is not None
+
+    @staticmethod
+    def find(lastName: str, firstName: str) -> Union[str, None]:
+        """
+        Returns the image for already normalised names, see splitName. Loads the index if necessary.
+        :param lastName: Normalised last name
+        :param firstName: Normalised first name
+        :return: Link to the image or None
+        """
+        if PlayerLookup.index is None:
+            PlayerLookup.load()
+
+        if isinstance(PlayerLookup.index, PlayerIndexFile):
+            return PlayerLookup.index.find(lastName, firstName)
+
+        entry = PlayerLookup.index.get(lastName)
+        if entry is None:
+            return None
+        if isinstance(entry, tuple):
+            return entry[1]
+        return entry.get(firstName, entry[None])
+
+    @staticmethod
+    def image(playerName: str) -> Union[str, None]:
+        """
+        Returns the image for a full player name
+        :param playerName: Name of the player, i.e. "Thomas Müller"
+        :return: Link to the image or None
+        """
+        return PlayerLookup.find(*PlayerLookup.splitName(playerName))
+
+    @staticmethod
+    async def asyncImage(playerName: str) -> Union[str, None]:
+        """
+        Awaitable version of image. Only the first call needs the database, afterwards the answer comes from memory.
+        """
+        if PlayerLookup.index is None:
+            await DBExecutor.run(PlayerLookup.load)
+        return PlayerLookup.image(playerName)
+
+    @staticmethod
+    def statistics() -> Dict[str, int]:
+        index = PlayerLookup.index
+        if index is None:
+            return {'loaded': 0}
+        if isinstance(index, PlayerIndexFile):
+            return {'loaded': 1, 'players': index.playerCount, 'records': index.recordCount,
+                    'fileSize': len(index.map)}
+        return {'loaded': 1, 'lastNames': len(index)}
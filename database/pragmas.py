@@ -0,0 +1,57 @@
+import logging
+from typing import Dict
+
+from django.conf import settings
+from django.db import connection as defaultConnection
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+
+# stored in the database file, so they only need to be set if they differ
+persistentPragmas = ['journal_mode']
+
+
+def pragmaProfile() -> Dict:
+    """
+    Returns the pragmas applied to every SQLite connection, configured by SQLITE_PRAGMAS in the settings
+    """
+    return getattr(settings, 'SQLITE_PRAGMAS', {})
+
+
+@receiver(connection_created)
+def applyPragmas(sender, connection, **kwargs):
+    """
+    Applies the pragma profile to every new SQLite connection created by Django. Pragmas that persist in the
+    database file are only set if the file doesn't use them yet, changing them needs a lock on the database.
+    """
+    if connection.vendor != 'sqlite':
+        return
+
+    with connection.cursor() as cursor:
+        for key, value in pragmaProfile().items():
+            if key in persistentPragmas:
+                cursor.execute(f"PRAGMA {key}")
+                if str(cursor.fetchone()[0]).lower() == str(value).lower():
+                    continue
+            cursor.execute(f"PRAGMA {key}={value}")
+
+
+def maintainDatabase() -> Dict[str, int]:
+    """
+    Moves the content of the WAL file back into the database and lets SQLite update its statistics. Should run
+    regularly, see the maintanance scheduler.
+    :return: Result of the checkpoint
+    """
+    if defaultConnection.vendor != 'sqlite':
+        return {}
+
+    with defaultConnection.cursor() as cursor:
+        cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        busy, logFrames, checkpointed = cursor.fetchone()
+        cursor.execute("PRAGMA optimize")
+
+    result = {'busy': busy, 'logFrames': logFrames, 'checkpointed': checkpointed}
+    logger.info(f"Database maintanance done: {result}")
+    return result
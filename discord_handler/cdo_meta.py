@@ -8,10 +8,12 @@ import os
 import json
 from enum import Enum
 import re
+import time
 import traceback
 
 from discord_handler.client import client
 from database.models import DiscordUsers,Settings
+from database.cache import SettingsCache, PermissionCache
 
 logger = logging.getLogger(__name__)
 
@@ -147,10 +149,116 @@ class DiscordCommando:
     def addCommando(commando):
         logger.info(f"Add commando {commando}")
         discordCommandos.append(commando)
+        CommandoIndex.add(commando)
 
     def __str__(self):
         return f"Cmd {self.cmd_group}:{self.commando}, userLevel {self.userLevel}"
 
+class CommandoIndex:
+    """
+    Dispatch index for the commandos, filled on registration. The first token of a message is looked up in a
+    dict; if it is not a commando itself, a trie finds the longest commando it starts with (i.e. addCompetition
+    is handled by add). Messages without the prefix are rejected right away.
+    """
+    commandos = {}
+    trie = {}
+
+    @staticmethod
+    def add(commando : DiscordCommando):
+        CommandoIndex.commandos[commando.commando] = commando
+        node = CommandoIndex.trie
+        for char in commando.commando:
+            node = node.setdefault(char, {})
+        node[None] = commando
+
+    @staticmethod
+    def find(content : str, prefix : str):
+        """
+        Returns the commando for a message
+        :param content: Content of the message
+        :param prefix: Prefix of the commandos
+        :return: DiscordCommando object or None if the message is no commando
+        """
+        if not content.startswith(prefix):
+            return None
+
+        token = content[len(prefix):].split(" ", 1)[0]
+
+        commando = CommandoIndex.commandos.get(token)
+        if commando is not None:
+            return commando
+
+        node = CommandoIndex.trie
+        for char in token:
+            node = node.get(char)
+            if node is None:
+                break
+            commando = node.get(None, commando)
+        return commando
+
+class ReactionRouter:
+    """
+    Routes reactions to the handler of the message they belong to, from the single on_reaction_add event. Handlers
+    are kept in insertion order, so expired ones are dropped from the front. A handler returning True is done and
+    removed, the same happens to the oldest handlers if there are more than maxEntries.
+    """
+    ttl = 3600
+    maxEntries = 500
+    handlers = OrderedDict()
+
+    @staticmethod
+    def add(messageID : int, handler : Callable):
+        """
+        Routes the reactions on a message to handler
+        :param messageID: Id of the message
+        :param handler: Function taking reaction and user, returns True once it is done
+        """
+        ReactionRouter.handlers.pop(messageID, None)
+        ReactionRouter.handlers[messageID] = (time.monotonic() + ReactionRouter.ttl, handler)
+        ReactionRouter.expire()
+        while len(ReactionRouter.handlers) > ReactionRouter.maxEntries:
+            ReactionRouter.handlers.popitem(last=False)
+
+    @staticmethod
+    def expire():
+        now = time.monotonic()
+        while len(ReactionRouter.handlers) != 0:
+            messageID, (expires, handler) = next(iter(ReactionRouter.handlers.items()))
+            if expires > now:
+                return
+            del ReactionRouter.handlers[messageID]
+
+    @staticmethod
+    def dispatch(reaction : Reaction, user : User) -> bool:
+        """
+        Passes a reaction to the handler of its message
+        :param reaction: Reaction that was added
+        :param user: User that added the reaction
+        :return: True if the handler is done
+        """
+        ReactionRouter.expire()
+        entry = ReactionRouter.handlers.get(reaction.message.id)
+        if entry is None:
+            return False
+
+        try:
+            done = entry[1](reaction, user)
+        except Exception as e:
+            logger.error(f"Reaction handler failed: {e.__class__.__name__} : {e}")
+            return False
+
+        if done:
+            ReactionRouter.handlers.pop(reaction.message.id, None)
+        return bool(done)
+
+    @staticmethod
+    def clear():
+        ReactionRouter.handlers.clear()
+
+    @staticmethod
+    def statistics() -> Dict[str, int]:
+        return {'handlers': len(ReactionRouter.handlers)}
+
 class Page:
     def __init__(self,cdoResp : CDOInteralResponseData,cdo : str,paging = None):
         self.addInfoList = []
@@ -229,32 +337,80 @@ def getEmbObj(responseData):
 
     return embObj
 
+class CommandArguments:
+    """
+    Arguments of a command call. The message is tokenized in a single pass by one compiled pattern: options (x=y)
+    are collected wherever they appear, mentions are collected and removed together with the whitespace in front
+    of them, all other text forms the positional parameters, separated by commas. Positional parameters left empty,
+    i.e. by options, are kept as "", so the following ones keep their position. The first token of the message
+    is the command itself. Unlike the former parser, values containing the command or an option are kept intact and
+    trailing whitespace doesn't create an empty parameter.
+    """
+    commandPattern = re.compile(r"[^ ,]*")
+    tokenPattern = re.compile(r"(\w+)(?:=([/\w\+]+))?"
+                              r"|\s*<@([!&]?\w+)>"
+                              r"|([^\w\s<]+|\s+(?!\s*<@[!&]?\w+>)|<)")
+
+    def __init__(self, commando : str, positional : List[str], options : Dict[str,str], mentions : List[str]):
+        self.commando = commando
+        self.positional = positional
+        self.options = options
+        self.mentions = mentions
+
+    def __eq__(self, other):
+        return isinstance(other, CommandArguments) and self.__dict__ == other.__dict__
+
+    def __repr__(self):
+        return f"CommandArguments({self.commando!r}, {self.positional!r}, {self.options!r}, {self.mentions!r})"
+
+    @staticmethod
+    def parse(msgContent : str):
+        """
+        Tokenizes a command call
+        :param msgContent: Content of the message
+        :return: CommandArguments object
+        """
+        commando = CommandArguments.commandPattern.match(msgContent).group()
+        options = {}
+        mentions = []
+        if "=" not in msgContent and "<" not in msgContent:
+            #only positional parameters, nothing to tokenize
+            text = [msgContent[len(commando):]]
+        else:
+            text = []
+            for word, value, mention, chunk in CommandArguments.tokenPattern.findall(msgContent, len(commando)):
+                if value:
+                    options[word] = value
+                elif word or chunk:
+                    text.append(word or chunk)
+                else:
+                    #whitespace left in front of a mention by removed options is removed as well
+                    text = ["".join(text).rstrip()]
+                    mentions.append(mention)
+
+        segments = "".join(text).split(",")
+        if segments[0] == "" or (len(segments) == 1 and segments[0].isspace()):
+            del segments[0]
+        return CommandArguments(commando, [i.strip() for i in segments], options, mentions)
+
+    def toDict(self) -> Dict[str,str]:
+        """
+        Arguments as they are passed to the commandos, positional parameters are named parameter0, parameter1, ...
+        :return: A dictionary full of parameters that can be added to kwargs
+        """
+        retDict = dict(self.options)
+        for index, value in enumerate(self.positional):
+            retDict[f"parameter{index}"] = value
+        return retDict
+
 def getParameters(msgContent : str) -> Dict[str,str]:
     """
     Get parameters parses through a command call and returns all parameters. Inline parameters are simply added
-    after the command, positional parameters can be added via x=y.
+    after the command, positional parameters can be added via x=y. See CommandArguments
     :param msgContent: msgContent for the parameters
     :return: A dictionary full of parameters that can be added to kwargs
     """
-    retDict = {}
-    #optional parameters
-    optPar = re.findall(r"\w+=[/\w\+]+",msgContent)
-    for i in optPar:
-        key,val = i.split("=")
-        retDict[key] = val
-        msgContent = msgContent.replace(i,"")
-    #inline parameters
-    msgContent = re.sub(r"\s*<@\w+>","",msgContent)
-    data = msgContent.split(",")
-    data[0] = data[0].replace(data[0].split(" ")[0], "") #remove Command
-    if data[0] == "":
-        data.remove(data[0])
-    for index in range(0,len(data)):
-        if isinstance(data[index],list):
-            retDict[f"parameter{index}"] = data[index][0].strip()
-        else:
-            retDict[f"parameter{index}"] = data[index].strip()
-    return retDict
+    return CommandArguments.parse(msgContent).toDict()
 
 async def sendResponse(responseData : CDOFullResponseData,onlyText = False,edit_msg : Message= None):
     logger.info(responseData)
@@ -276,50 +432,60 @@ async def sendResponse(responseData : CDOFullResponseData,onlyText = False,edit_
     return msg
 
 
+async def getPrefix() -> str:
+    """
+    Returns the prefix for commands, default is !
+    """
+    return await SettingsCache.asyncGet("prefix", "!")
+
+async def getUserLevel(user : User) -> int:
+    """
+    Returns the userlevel of a discord user. The master user is added with the highest level if not known yet.
+    :param user: Author of a message
+    :return: userlevel, 0 for unknown users
+    """
+    level = await PermissionCache.asyncLookup(user.id)
+    if level is None and user.id == masterUserID:
+        await PermissionCache.set(masterUserID, user.name, 6)
+        level = 6
+
+    return 0 if level is None else level
+
 async def cmdHandler(msg: Message) -> str:
     """
     Receives commands and handles it according to allCommandos. Commandos are automatically parsed from the code.
     :param msg: message from the discord channel
     :return:
     """
-    try:
-        prefix = Settings.objects.get(name="prefix")
-        prefix = prefix.value
-    except ObjectDoesNotExist:
-        prefix = "!"
+    prefix = await getPrefix()
 
-    for cdos in DiscordCommando.allCommandos():
-        if msg.content.startswith(prefix+cdos.commando):
-            if msg.author.bot:
-                logger.info("Ignoring {msg.content}, because bot")
-                return ""
+    cdos = CommandoIndex.find(msg.content, prefix)
+    if cdos is None:
+        return ""
 
-            if msg.author.id == masterUserID and len(DiscordUsers.objects.filter(id=masterUserID)) == 0:
-                DiscordUsers(id=masterUserID,name=msg.author.name,userLevel=6).save()
+    if msg.author.bot:
+        logger.info("Ignoring {msg.content}, because bot")
+        return ""
 
-            try:
-                userQuery = DiscordUsers.objects.get(id=msg.author.id)
-                authorUserLevel = userQuery.userLevel
-            except ObjectDoesNotExist:
-                authorUserLevel = 0
-
-            if cdos.userLevel <= authorUserLevel:
-                parseParameters = getParameters(msg.content)
-                logger.info(f"Handling {cdos.commando}")
-
-                tmpMsg = await sendResponse(
-                    CDOFullResponseData(msg.channel, cdos.commando, CDOInteralResponseData("Working ...")))
-                kwargs = {'cdo': cdos.commando,
-                          'userLevel': authorUserLevel,
-                          'prefix':prefix,
-                          'tmpMsg':tmpMsg}
-                kwargs.update(parseParameters)
-
-                return await cdos.fun(msg,**kwargs)
-            else:
-                responseStr = "I am sorry, you are not allowed to do that"
-                responseData = CDOFullResponseData(msg.channel, cdos.commando, CDOInteralResponseData(responseStr))
-                await sendResponse(responseData)
+    authorUserLevel = await getUserLevel(msg.author)
+
+    if cdos.userLevel <= authorUserLevel:
+        parseParameters = getParameters(msg.content)
+        logger.info(f"Handling {cdos.commando}")
+
+        tmpMsg = await sendResponse(
+            CDOFullResponseData(msg.channel, cdos.commando, CDOInteralResponseData("Working ...")))
+        kwargs = {'cdo': cdos.commando,
+                  'userLevel': authorUserLevel,
+                  'prefix':prefix,
+                  'tmpMsg':tmpMsg}
+        kwargs.update(parseParameters)
+
+        return await cdos.fun(msg,**kwargs)
+    else:
+        responseStr = "I am sorry, you are not allowed to do that"
+        responseData = CDOFullResponseData(msg.channel, cdos.commando, CDOInteralResponseData(responseStr))
+        await sendResponse(responseData)
 
 
 ############################### Decorators ##########################
@@ -382,28 +548,14 @@ def markCommando(cmd: str, group=GrpGeneral, defaultUserLevel=None):
                 msg = await sendResponse(responseData,responseDataInternal.onlyText,edit_msg=kwargs['tmpMsg'])
 
                 if responseDataInternal.reactionFunc is not None:
-
-                    def internalCheck(reaction: Reaction, user: User):
-                        if reaction.message.id == msg.id:
-                            return responseDataInternal.reactionFunc(reaction, user)
-                        else:
-                            return False
-
-                    await client.wait_for('reaction_add', check=internalCheck)
+                    ReactionRouter.add(msg.id, responseDataInternal.reactionFunc)
             else:
                 pageObj = Page(responseDataInternal,cmd,paging=responseDataInternal.paging)
                 responseData = CDOFullResponseData(msg.channel,cmd,pageObj.getInitialData())
                 msg = await sendResponse(responseData,edit_msg=kwargs['tmpMsg'])
                 await resetPaging(msg)
                 pageObj.setMsg(msg)
-
-                def internalCheck(reaction : Reaction, user: User):
-                    if reaction.message.id == msg.id:
-                        return pageObj.reactFunc(reaction,user)
-                    else:
-                        return False
-
-                await client.wait_for('reaction_add',check =internalCheck)
+                ReactionRouter.add(msg.id, pageObj.reactFunc)
             return
 
         DiscordCommando.addCommando(DiscordCommando(cmd, func_wrapper, func.__doc__, group, defaultUserLevel))
@@ -11,11 +11,15 @@ from discord import Reaction,User,Message
 from dateutil import parser
 
 from database.models import CompetitionWatcher, Competition,Settings,DiscordUsers,Goal,Team
+from database.executor import DBExecutor, DBWriter
+from database.players import PlayerLookup
+from database.cache import SettingsCache, PermissionCache
 from discord_handler.handler import client, watchCompetition,Scheduler
 from discord_handler.cdo_meta import markCommando, CDOInteralResponseData, cmdHandler, emojiList\
-    , DiscordCommando,InfoObj
+    , DiscordCommando,InfoObj,getUserLevel,ReactionRouter
 from discord_handler.liveMatch import LiveMatch
-from api.calls import getLiveMatches,makeMiddlewareCall,DataCalls,getTeamsSearchedByName
+from api.calls import asyncGetLiveMatches,asyncMakeMiddlewareCall,DataCalls,asyncGetTeamsSearchedByName,HttpClient\
+    ,ResponseCache,DiskCache,SingleFlight,RateLimiter,Fingerprints
 from api.stats import getTopScorers, getLeagueTable,getPlayerInfo
 from support.helper import shutdown,checkoutVersion,getVersions,currentVersion
 
@@ -53,7 +57,8 @@ async def cdoAddCompetition(msg : Message,**kwargs):
     else:
         return CDOInteralResponseData("You need to give me a competition, mate")
 
-    comp = Competition.objects.filter(clear_name=parameter)
+    comp = await DBExecutor.run(lambda: list(Competition.objects.filter(clear_name=parameter)
+                                             .select_related('association').order_by('id')))
 
     logger.debug(f"Available competitions: {comp}")
     if len(comp) == 0:
@@ -67,14 +72,14 @@ async def cdoAddCompetition(msg : Message,**kwargs):
                                     f"**Premier League,ENG**"
             return responseData
         else:
-            comp = comp.filter(association=kwargs['parameter1'])
+            comp = [i for i in comp if i.association_id == kwargs['parameter1']]
             if len(comp) > 1:
                 return CDOInteralResponseData(f"Sorry, we still couldn't find a unique competition. Found competitions "
                                               f"are {[(i.clear_name,i.association) for i in comp]}")
             elif len(comp) <1:
                 return CDOInteralResponseData(f"Sorry no competition was found with {parameter},{kwargs['parameter1']}")
 
-    watcher = CompetitionWatcher.objects.filter(competition=comp.first())
+    watcher = await DBExecutor.run(lambda: list(CompetitionWatcher.objects.filter(competition=comp[0])))
 
     logger.debug(f"Watcher objects: {watcher}")
 
@@ -99,7 +104,7 @@ async def cdoAddCompetition(msg : Message,**kwargs):
                 if i.name == fullRole:
                     role = i.id
 
-    client.loop.create_task(watchCompetition(comp.first(), msg.guild, channel,role,category))
+    client.loop.create_task(watchCompetition(comp[0], msg.guild, channel,role,category))
 
     return responseData
 
@@ -110,25 +115,16 @@ async def cdoDefaultCategory(msg : Message,**kwargs):
     :param kwargs: 
     :return: 
     """
-    try:
-        defaultCategory = Settings.objects.get(name="defaultCategory")
-    except ObjectDoesNotExist:
-        defaultCategory = None
-
     if "parameter0" not in kwargs.keys():
+        defaultCategory = await SettingsCache.asyncGet("defaultCategory")
         if defaultCategory is not None:
-            return CDOInteralResponseData(f"Default category is **{defaultCategory.value}**")
+            return CDOInteralResponseData(f"Default category is **{defaultCategory}**")
         else:
             return CDOInteralResponseData(f"No default category set yet")
 
-    if defaultCategory is not None:
-        defaultCategory.value = kwargs['parameter0']
-    else:
-        defaultCategory = Settings(name="defaultCategory",value=kwargs['parameter0'])
-
-    defaultCategory.save()
+    await SettingsCache.set("defaultCategory", kwargs['parameter0'])
 
-    return CDOInteralResponseData(f"Default category set to **{defaultCategory.value}**")
+    return CDOInteralResponseData(f"Default category set to **{kwargs['parameter0']}**")
 
 
 
@@ -144,7 +140,8 @@ async def cdoRemoveCompetition(msg : Message,**kwargs):
     else:
         return CDOInteralResponseData("You need to give me a competition, mate")
 
-    watcher = CompetitionWatcher.objects.filter(competition__clear_name=parameter)
+    watcher = await DBExecutor.run(lambda: list(CompetitionWatcher.objects.filter(competition__clear_name=parameter)
+                                                .select_related('competition__association').order_by('id')))
 
     if len(watcher) == 0:
         responseData.response = f"Competition {parameter} was not monitored"
@@ -152,7 +149,7 @@ async def cdoRemoveCompetition(msg : Message,**kwargs):
 
     if len(watcher) > 1:
         if "parameter1" in kwargs.keys():
-            watcher = watcher.filter(competition__association=kwargs['parameter1'])
+            watcher = [i for i in watcher if i.competition.association_id == kwargs['parameter1']]
         else:
             nameCode = [f"{i.competition.clear_name},{i.competition.association}" for i in watcher]
             return CDOInteralResponseData(f"We have multiple competitions that match {parameter}, "
@@ -162,8 +159,8 @@ async def cdoRemoveCompetition(msg : Message,**kwargs):
                                           f"**{kwargs['prefix']}removeCompetition Premier League,ENG**")
 
     logger.info(f"Deleting {watcher}")
-    await Scheduler.removeCompetition(watcher.first())
-    watcher.delete()
+    await Scheduler.removeCompetition(watcher[0])
+    await DBWriter.run(lambda: CompetitionWatcher.objects.filter(id__in=[i.id for i in watcher]).delete())
     responseData.response = f"Removed {parameter} from monitoring"
     return responseData
 
@@ -178,7 +175,9 @@ async def cdoShowMonitoredCompetitions(msg : Message,**kwargs):
                 f"be added this way):\n\n"
     addInfo = InfoObj()
     compList = []
-    for watchers in CompetitionWatcher.objects.all():
+    watcherList = await DBExecutor.run(lambda: list(CompetitionWatcher.objects
+                                                    .select_related('competition__association').all()))
+    for watchers in watcherList:
         compList.append(watchers.competition)
         try:
             addInfo[watchers.competition.association.clear_name].description +=(f"\n{watchers.competition.clear_name}")
@@ -209,10 +208,14 @@ async def cdoListCompetitionByCountry(msg : Message,**kwargs):
 
     association = kwargs['parameter0']
 
-    competition = Competition.objects.filter(association__clear_name=association)
+    def competitionsByAssociation():
+        competition = list(Competition.objects.filter(association__clear_name=association))
 
-    if len(competition) == 0:
-        competition = Competition.objects.filter(association_id=association)
+        if len(competition) == 0:
+            competition = list(Competition.objects.filter(association_id=association))
+        return competition
+
+    competition = await DBExecutor.run(competitionsByAssociation)
 
     if len(competition) == 0:
         responseData.response = f"No competitions were found for {association}"
@@ -223,7 +226,7 @@ async def cdoListCompetitionByCountry(msg : Message,**kwargs):
 
     for comp in competition:
         retString += comp.clear_name + "\n"
-        compList.append(f"{comp.clear_name},{comp.association.id}")
+        compList.append(f"{comp.clear_name},{comp.association_id}")
 
     retString += f"\n\nReact with according number emoji to add competitions. Only the first {len(emojiList())} can " \
                  f"be added this way"
@@ -254,11 +257,7 @@ async def cdoGetHelp(msg : Message,**kwargs):
     retString = "Available Commandos:"
     addInfo = InfoObj()
 
-    try:
-        userQuery = DiscordUsers.objects.get(id=msg.author.id)
-        authorUserLevel = userQuery.userLevel
-    except ObjectDoesNotExist:
-        authorUserLevel = 0
+    authorUserLevel = await getUserLevel(msg.author)
 
     for i in DiscordCommando.allCommandos():
         if i.userLevel <= authorUserLevel:
@@ -291,6 +290,32 @@ async def cdoShowRunningTasks(msg : Message,**kwargs):
 
     return CDOInteralResponseData(responseString, addInfo)
 
+@markCommando("apiStats", defaultUserLevel=6)
+async def cdoApiStats(msg : Message,**kwargs):
+    """
+    Shows statistics of the connections to the FIFA api
+    :return:
+    """
+    addInfo = InfoObj()
+
+    for host,stats in HttpClient.poolStatistics().items():
+        addInfo[f"Pool {host}"] = "\n".join([f"{key}: {val}" for key,val in stats.items()])
+
+    addInfo["Response cache"] = "\n".join([f"{key}: {val}" for key,val in ResponseCache.statistics().items()])
+    addInfo["Disk cache"] = "\n".join([f"{key}: {val}" for key,val in DiskCache.statistics().items()])
+    addInfo["Coalesced calls"] = "\n".join([f"{key}: {val}" for key,val in SingleFlight.statistics().items()])
+    addInfo["Database executor"] = "\n".join([f"{key}: {val}" for key,val in DBExecutor.statistics().items()])
+    addInfo["Database writer"] = "\n".join([f"{key}: {val}" for key,val in DBWriter.statistics().items()])
+    addInfo["Player lookup"] = "\n".join([f"{key}: {val}" for key,val in PlayerLookup.statistics().items()])
+    addInfo["Fingerprints"] = "\n".join([f"{key}: {val}" for key,val in Fingerprints.statistics().items()])
+    addInfo["Reaction router"] = "\n".join([f"{key}: {val}" for key,val in ReactionRouter.statistics().items()])
+    addInfo["Rate limiter"] = "\n".join([f"{key}: {val}" for key,val in RateLimiter.statistics().items()])
+
+    for host,budget in RateLimiter.budget().items():
+        addInfo[f"Budget {host}"] = f"{budget['tokens']} tokens, {budget['rate']} requests/s"
+
+    return CDOInteralResponseData("Api statistics:", addInfo)
+
 @markCommando("scores")
 async def cdoScores(msg : Message,**kwargs):
     """
@@ -330,19 +355,19 @@ async def cdoScores(msg : Message,**kwargs):
         return resp
     else:
         searchString = kwargs['parameter0']
-        query = Competition.objects.filter(clear_name = searchString)
+        query = await DBExecutor.run(lambda: list(Competition.objects.filter(clear_name = searchString).order_by('id')))
 
         if len(query) == 0:
-            teamList = getTeamsSearchedByName(searchString)
+            teamList = await asyncGetTeamsSearchedByName(searchString)
             if len(teamList) == 0:
                 return CDOInteralResponseData(f"Can't find team {searchString}")
             matchObj = teamList[0]['Name'][0]['Description']
-            matchList = getLiveMatches(teamID=int(teamList[0]["IdTeam"]))
+            matchList = await asyncGetLiveMatches(teamID=int(teamList[0]["IdTeam"]))
 
         else:
-            comp = query.first()
+            comp = query[0]
             matchObj = comp.clear_name
-            matchList = getLiveMatches(competitionID=comp.id)
+            matchList = await asyncGetLiveMatches(competitionID=comp.id)
 
         if len(matchList) == 0:
             return CDOInteralResponseData(f"No current matches for {matchObj}")
@@ -350,7 +375,7 @@ async def cdoScores(msg : Message,**kwargs):
         addInfo = InfoObj()
         for matchID in matchList:
             try:
-                data = makeMiddlewareCall(DataCalls.liveData + f"/{matchID}")
+                data = await asyncMakeMiddlewareCall(DataCalls.liveData + f"/{matchID}")
             except JSONDecodeError:
                 logger.error(f"Failed to do a middleware call for {matchID}")
                 continue
@@ -387,7 +412,8 @@ async def basicStatsFun(msg,fun,onlyText,**kwargs):
 
     searchString = kwargs['parameter0']
 
-    competition = Competition.objects.filter(clear_name=searchString)
+    competition = await DBExecutor.run(lambda: list(Competition.objects.filter(clear_name=searchString)
+                                                    .select_related('association').order_by('id')))
     if len(competition) == 0:
         return CDOInteralResponseData(f"Sorry, can't find {searchString}")
 
@@ -412,9 +438,11 @@ async def basicStatsFun(msg,fun,onlyText,**kwargs):
 
             return CDOInteralResponseData(retString,reactionFunc=check)
         else:
-            competition = competition.filter(association_id=kwargs['parameter1'])
+            competition = [i for i in competition if i.association_id == kwargs['parameter1']]
+            if len(competition) == 0:
+                return CDOInteralResponseData(f"Sorry, can't find {searchString},{kwargs['parameter1']}")
 
-    addInfo = await fun(competition.first())
+    addInfo = await fun(competition[0])
     if addInfo == InfoObj():
         return CDOInteralResponseData(f"Sorry no data available for {searchString}")
     else:
@@ -440,20 +468,22 @@ async def cdoGoals(msg : Message,**kwargs):
     :param kwargs:
     :return:
     """
-    if "parameter0" in kwargs.keys():
-        teams = Team.objects.filter(clear_name=kwargs['parameter0'])
-        if len(teams) != 0:
-            goalListHome = Goal.objects.filter(match_home_Team__clear_name=kwargs['parameter0']).order_by(
-                'match__date')
-            goalListAway = Goal.objects.filter(match_away_Team__clear_name=kwargs['parameter0']).order_by(
-                'match__date')
-            goalist = goalListHome | goalListAway
+    def goals():
+        goalQuery = Goal.objects.select_related('match__home_team').order_by('match__date')
+        if "parameter0" in kwargs.keys():
+            teams = Team.objects.filter(clear_name=kwargs['parameter0'])
+            if len(teams) != 0:
+                goalListHome = goalQuery.filter(match__home_team__clear_name=kwargs['parameter0'])
+                goalListAway = goalQuery.filter(match__away_team__clear_name=kwargs['parameter0'])
+                return list(goalListHome | goalListAway)
+            else:
+                return list(goalQuery.filter(player=kwargs['parameter0']))
         else:
-            goalList = Goal.objects.filter(player=kwargs['parameter0']).order_by('match__date')
-            if len(goalList) == 0:
-                return CDOInteralResponseData(f"Sorry, nothing found for {kwargs['parameter0']}")
-    else:
-        goalList = Goal.objects.all().order_by('match__date')
+            return list(goalQuery.all())
+
+    goalList = await DBExecutor.run(goals)
+    if "parameter0" in kwargs.keys() and len(goalList) == 0:
+        return CDOInteralResponseData(f"Sorry, nothing found for {kwargs['parameter0']}")
 
     retDict = InfoObj()
 
@@ -490,7 +520,7 @@ async def cdoPlayerInfo(msg : Message,**kwargs):
         return CDOInteralResponseData("You need to tell me the name of the player!")
 
     searchString = kwargs['parameter0']
-    res = getPlayerInfo(searchString)
+    res = await getPlayerInfo(searchString)
     if res != None:
         playerName = res[0]
         addInfo = res[1]
@@ -507,7 +537,10 @@ async def cdoCurrentGames(msg : Message,**kwargs):
     """
 
     if "parameter0" in kwargs.keys():
-        competition = Competition.objects.filter(clear_name=kwargs['parameter0'])
+        competition = await DBExecutor.run(lambda: Competition.objects.filter(clear_name=kwargs['parameter0'])
+                                           .order_by('id').first())
+        if competition is None:
+            return CDOInteralResponseData(f"Sorry, can't find {kwargs['parameter0']}")
     else:
         competition = None
 
@@ -517,7 +550,7 @@ async def cdoCurrentGames(msg : Message,**kwargs):
         if competition == None:
             addInfo[match.title] = f"{match.minute}"
         else:
-            if match.match.competition == competition.first():
+            if match.match.competition_id == competition.id:
                 addInfo[match.title] = f"{match.minute}"
 
     if addInfo == InfoObj():
@@ -537,8 +570,9 @@ async def cdoUpcomingGames(msg : Message,**kwargs):
     :return:
     """
     if "parameter0" in kwargs.keys():
-        competition = Competition.objects.filter(clear_name=kwargs['parameter0'])
-        watchers = CompetitionWatcher.objects.filter(competition=competition)
+        competition = await DBExecutor.run(lambda: Competition.objects.filter(clear_name=kwargs['parameter0'])
+                                           .order_by('id').first())
+        watchers = await DBExecutor.run(lambda: list(CompetitionWatcher.objects.filter(competition=competition)))
     else:
         competition = None
         watchers = []
@@ -557,7 +591,7 @@ async def cdoUpcomingGames(msg : Message,**kwargs):
         if competition == None:
             addInfo[match.title] = match.match.date
         else:
-            if match.match.competition == competition.first():
+            if match.match.competition_id == competition.id:
                 addInfo[match.title] = match.match.date
                 
     tmpAddInfo =  dict([(k, addInfo[k]) for k in sorted(addInfo, key=addInfo.get, reverse=False)])
@@ -582,23 +616,15 @@ async def cdoSetStartCDO(msg : Message,**kwargs):
     :param kwargs:
     :return:
     """
-    if kwargs['parameter0'] not in kwargs.keys():
-        if len(Settings.objects.filter(name="startCommando")) == 0:
+    if 'parameter0' not in kwargs.keys():
+        startCommando = await SettingsCache.asyncGet("startCommando")
+        if startCommando is None:
             return CDOInteralResponseData("You need to set a command to be executed to start the bot")
         else:
-            obj = Settings.objects.get(name='startCommando')
-            return CDOInteralResponseData(f"Current restart command: _{obj.value}_")
+            return CDOInteralResponseData(f"Current restart command: _{startCommando}_")
     commandString = kwargs['parameter0']
 
-    try:
-        Settings(name="startCommando",value=commandString)
-    except IntegrityError:
-        obj = Settings.objects.get(name='startCommando')
-        obj.value=commandString
-        obj.save()
-
-    obj = Settings(name="startCommando",value=commandString)
-    obj.save()
+    await SettingsCache.set("startCommando", commandString)
     return CDOInteralResponseData(f"Setting startup command to {commandString}")
 
 @markCommando("update", defaultUserLevel=5)
@@ -655,15 +681,14 @@ async def cdoRestartBot(msg : Message,**kwargs):
     :param kwargs:
     :return:
     """
-    try:
-        Settings.objects.get(name="startCommando")
+    if await SettingsCache.asyncGet("startCommando") is not None:
         logger.info(f"Command: {sys.executable} {path+'/../restart.py'}")
         cmdList = [sys.executable,path+"/../restart.py"]
         logger.info(cmdList)
         p = subprocess.Popen(cmdList)
         logger.info(f"ID of subprocess : {p.pid}")
         return CDOInteralResponseData("Shutting down in 10 seconds. Restart will take around 30 seconds")
-    except ObjectDoesNotExist:
+    else:
         return CDOInteralResponseData("You need to set the startup Command with !setStartCommando before this"
                                       "commando is available")
 
@@ -674,18 +699,12 @@ async def cdoSetPrefix(msg : Message,**kwargs):
     :param kwargs:
     :return:
     """
-    if kwargs['parameter0'] in kwargs.keys():
-        return CDOInteralResponseData("You need to set a command to be executed to start the bot")
+    if 'parameter0' not in kwargs.keys():
+        return CDOInteralResponseData("You need to give me the new prefix")
 
     commandString = kwargs['parameter0']
-    try:
-        prefix = Settings.objects.get(name="prefix")
-        prefix.value = commandString
-    except ObjectDoesNotExist:
-        prefix = Settings(name="prefix",value=commandString)
-
-    prefix.save()
-    return CDOInteralResponseData(f"New prefix is {prefix.value}")
+    await SettingsCache.set("prefix", commandString)
+    return CDOInteralResponseData(f"New prefix is {commandString}")
 
 @markCommando("setPermissions", defaultUserLevel=5)
 async def cdoSetUserPermissions(msg : Message,**kwargs):
@@ -718,7 +737,7 @@ async def cdoSetUserPermissions(msg : Message,**kwargs):
 
     retString = ""
     for user in msg.mentions:
-        DiscordUsers(id=user.id,name=user.name,userLevel=level).save()
+        await PermissionCache.set(user.id, user.name, level)
         retString += f"Setting {user.name} with id {user.id} to user level {level}\n"
 
     return CDOInteralResponseData(retString)
@@ -732,11 +751,8 @@ async def cdoGetUserPermissions(msg : Message,**kwargs):
     """
     addInfo = InfoObj()
     for user in msg.mentions:
-        try:
-            user = DiscordUsers.objects.get(id=user.id)
-            addInfo[user.name] = f"User level: {user.userLevel}"
-        except ObjectDoesNotExist:
-            addInfo[user.name] = f"User level: 0"
+        level = await PermissionCache.asyncLookup(user.id)
+        addInfo[user.name] = f"User level: {0 if level is None else level}"
 
     if addInfo == InfoObj():
         return CDOInteralResponseData("You need to mention a user to get its permission status!")
@@ -8,7 +8,9 @@ from collections import OrderedDict
 import discord
 
 from database.models import CompetitionWatcher,  DiscordServer, Season, Competition,Settings
-from database.handler import updateOverlayData, updateMatches, getNextMatchDayObjects, getCurrentMatches
+from database.executor import DBWriter, DBExecutor
+from database.pragmas import maintainDatabase
+from database.handler import updateOverlayData, updateMatches, getNextMatchDayObjects
 from database.handler import updateMatchesSingleCompetition, getAllSeasons, getAndSaveData,compDict
 from discord_handler.liveMatch import LiveMatch
 from support.helper import task
@@ -146,9 +148,11 @@ class Scheduler:
                 logger.info("Data maintanance running ...")
 
                 # update competitions, seasons etc. Essentially the data that is always there
-                await updateOverlayData()
+                await DBExecutor.run(updateOverlayData)
                 # update all matches for the monitored competitions
-                updateMatches()
+                await DBExecutor.run(updateMatches)
+                # checkpoint the WAL file and refresh the query planner statistics
+                await DBExecutor.run(maintainDatabase)
 
                 Scheduler.maintananceSynchronizer.clear()
                 logger.info(f"Sleeping for {targetTime}")
@@ -351,19 +355,22 @@ async def watchCompetition(competition: Competition, serverName: str,unified_cha
     """
     logger.info(f"Start watching competition {competition} on {serverName}")
 
-    season = Season.objects.filter(competition=competition).order_by('start_date').last()
-    if season == None:
-        getAndSaveData(getAllSeasons, idCompetitions=competition.id)
+    def syncSeason() -> Season:
         season = Season.objects.filter(competition=competition).order_by('start_date').last()
-    server = DiscordServer(name=serverName)
-    server.save()
+        if season == None:
+            getAndSaveData(getAllSeasons, idCompetitions=competition.id)
+            season = Season.objects.filter(competition=competition).order_by('start_date').last()
+        updateMatchesSingleCompetition(competition=competition, season=season, full=True)
+        return season
 
-    updateMatchesSingleCompetition(competition=competition, season=season)
+    season = await DBExecutor.run(syncSeason)
+    server = DiscordServer(name=serverName)
+    await DBWriter.run(server.save)
 
     compWatcher = CompetitionWatcher(competition=competition,
                                      current_season=season, applicable_server=server, current_matchday=1,role=role,category=category)
     if unified_channel is not None:
         compWatcher.unified_channel = unified_channel
 
-    compWatcher.save()
+    await DBWriter.run(compWatcher.save)
     Scheduler.addCompetition(compWatcher)
\ No newline at end of file
@@ -12,8 +12,9 @@ import os
 import re
 import random
 
-from database.models import Match, MatchEvents, Player
-from api.calls import makeMiddlewareCall, DataCalls
+from database.models import Match, MatchEvents
+from database.players import PlayerLookup
+from api.calls import asyncMakeMiddlewareCall, DataCalls
 from discord_handler.client import client, toDiscordChannelName
 from support.helper import task
 from api.reddit import RedditParser,RedditEvent
@@ -135,7 +136,7 @@ class LiveMatch:
                 if self.stopFlag:
                     return
                 try:
-                    data = makeMiddlewareCall(DataCalls.liveData + f"/{matchid}")
+                    data = await asyncMakeMiddlewareCall(DataCalls.liveData + f"/{matchid}")
                 except JSONDecodeError:
                     break
 
@@ -289,7 +290,7 @@ class LiveMatch:
         :param match:
         :return:
         """
-        data = makeMiddlewareCall(DataCalls.liveData + f"/{match.id}")['match']
+        data = (await asyncMakeMiddlewareCall(DataCalls.liveData + f"/{match.id}"))['match']
         homeTeam = data['teamHomeName']
         awayTeam = data['teamAwayName']
 
@@ -357,22 +358,7 @@ class LiveMatch:
         embObj.set_author(name=match.competition.clear_name)
         embObj.colour = self.color
 
-        lastName = event.player.split(" ")[-1].lower()
-        firstName = event.player.split(" ")[0].lower()
-
-        imageList = Player.objects.filter(lastName=lastName)
-        image = None
-
-        if len(imageList) != 0:
-            if len(imageList) == 1:
-                image = imageList.first().imageLink
-            else:
-                imageList = imageList.filter(firstName=firstName)
-                if len(imageList) != 0:
-                    image = imageList.first().imageLink
-                else:
-                    imageList = Player.objects.filter(lastName=lastName)
-                    image = imageList.first().imageLink
+        image = await PlayerLookup.asyncImage(event.player)
 
         if image is not None:
             embObj.set_thumbnail(url=image)
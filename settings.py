@@ -7,9 +7,21 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # the database threads (see database/executor.py) keep their connection instead of reconnecting per call
+        'CONN_MAX_AGE': None,
     }
 }
 
+# Applied to every SQLite connection, which is kept open by the database threads, see database/pragmas.py
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 268435456,
+    'cache_size': -65536,
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000,
+}
+
 INSTALLED_APPS = (
     'database',
 )
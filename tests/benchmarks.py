@@ -0,0 +1,38 @@
+"""
+Micro-benchmarks comparing reworked hot paths with their former implementations. They are not part of the test
+suite, run them with python -m tests.benchmarks
+"""
+import os
+import timeit
+from django.core.wsgi import get_wsgi_application
+# Django specific settings
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "settings")
+# Ensure settings are read
+application = get_wsgi_application()
+
+from api.calls import decodeJsonp
+from discord_handler.cdo_meta import getParameters
+from tests.testAPI.test_calls import legacyDecodeJsonp, path
+from tests.testDiscordHandler.test_cdos import legacyGetParameters, benchmarkMessages
+
+
+def report(name : str, legacy, new, number : int):
+    legacyTime = min(timeit.repeat(legacy, number=number, repeat=5)) / number
+    newTime = min(timeit.repeat(new, number=number, repeat=5)) / number
+    print(f"{name}: legacy {legacyTime * 1e6:.1f}us, new {newTime * 1e6:.1f}us, "
+          f"speedup {legacyTime / newTime:.2f}x")
+
+def benchmarkDecodeJsonp():
+    with open(path + "live.json", "rb") as f:
+        content = b"_jsonpCallback(" + f.read() + b")"
+    report(f"JSONP decoding of live.json ({len(content)} bytes)",
+           lambda: legacyDecodeJsonp(content), lambda: decodeJsonp(content), 200)
+
+def benchmarkGetParameters():
+    report(f"Parsing {len(benchmarkMessages)} commands",
+           lambda: [legacyGetParameters(i) for i in benchmarkMessages],
+           lambda: [getParameters(i) for i in benchmarkMessages], 2000)
+
+if __name__ == "__main__":
+    benchmarkDecodeJsonp()
+    benchmarkGetParameters()
@@ -5,6 +5,10 @@ from httmock import all_requests, HTTMock
 from typing import Dict
 import json
 import os
+import time
+import threading
+import requests
+import re
 
 
 def loadJsonFile(fileName: str) -> Dict:
@@ -62,6 +66,9 @@ def unifiedHttMock(url,request):
         data = loadJsonFile(path+ "specificTeam.json")
     elif DataCalls.liveData in request.path_url:
         data = loadJsonFile(path + "live.json")
+    elif "playerdata.xml" in request.path_url:
+        with open(path + "playerdata.xml", "rb") as f:
+            data = f.read()
     else:
         data = {}
     return {'status_code': 200,
@@ -151,3 +158,275 @@ def testGetCalls(values):
                 assert isinstance(i, values[0])
         else:
             assert isinstance(feds, Team)
+
+@pytest.mark.asyncio
+async def testAsyncMakeCalls():
+    """
+    Awaitable variants need to return the same data as their blocking counterparts
+    """
+    with HTTMock(unifiedHttMock):
+        result = await asyncMakeAPICall(ApiCalls.federations)
+        assert result == makeAPICall(ApiCalls.federations)
+        result = await asyncMakeMiddlewareCall(DataCalls.liveData)
+        assert isinstance(result, dict)
+        result = await asyncGetAllFederations()
+        for i in result:
+            assert isinstance(i, Federation)
+
+def testHttpClient():
+    """
+    All calls go through one shared session with a pool per FIFA host
+    """
+    with HTTMock(unifiedHttMock):
+        session = HttpClient.getSession()
+        makeAPICall(ApiCalls.federations)
+        makeMiddlewareCall(DataCalls.liveData)
+        assert HttpClient.getSession() is session
+
+    stats = HttpClient.poolStatistics()
+    assert set(stats.keys()) == {"api.fifa.com", "data.fifa.com"}
+    for hostStats in stats.values():
+        assert hostStats['maxSize'] == HttpClient.poolMaxSize
+
+    HttpClient.configure(poolMaxSize=4)
+    assert HttpClient.getSession() is not session
+    assert HttpClient.poolStatistics()["api.fifa.com"]['maxSize'] == 4
+    HttpClient.configure(poolMaxSize=16)
+
+def testResponseCache(monkeypatch):
+    """
+    Repeated calls are served from the cache until they expire or are invalidated
+    """
+    requestList = []
+
+    def countingMock(url, request):
+        requestList.append(request.path_url)
+        return unifiedHttMock(url, request)
+
+    ResponseCache.invalidate()
+    assert ResponseCache.ttl(ApiCalls.specificTeam + "/1234") == ResponseCache.ttlPolicy[ApiCalls.specificTeam]
+    assert ResponseCache.ttl(ApiCalls.teams) == ResponseCache.ttlPolicy[ApiCalls.teams]
+    assert ResponseCache.ttl("unknown") == ResponseCache.defaultTTL
+
+    with HTTMock(countingMock):
+        hits = ResponseCache.hits
+        first = makeAPICall(ApiCalls.federations)
+        assert makeAPICall(ApiCalls.federations) == first
+        assert len(requestList) == 1
+        assert ResponseCache.hits == hits + 1
+
+        makeAPICall(ApiCalls.countries, {'count': 1000})
+        assert len(requestList) == 2
+
+        ResponseCache.invalidate(ApiCalls.federations)
+        makeAPICall(ApiCalls.federations)
+        makeAPICall(ApiCalls.countries, {'count': 1000})
+        assert len(requestList) == 3
+
+        monkeypatch.setitem(ResponseCache.ttlPolicy, DataCalls.liveData, 0)
+        makeMiddlewareCall(DataCalls.liveData)
+        makeMiddlewareCall(DataCalls.liveData)
+        assert len(requestList) == 5
+
+    monkeypatch.setattr(ResponseCache, "maxSize", 1)
+    ResponseCache.put(ApiCalls.federations, "a", {}, b"a")
+    ResponseCache.put(ApiCalls.federations, "b", {}, b"b")
+    assert ResponseCache.get("a", {}) is None
+    assert ResponseCache.get("b", {}) == b"b"
+    ResponseCache.invalidate()
+
+def testDiskCache(tmpdir, monkeypatch):
+    """
+    Stored responses are reused from disk and revalidated with their ETag once they are stale
+    """
+    requestList = []
+
+    def etagMock(url, request):
+        requestList.append(request.headers.get('If-None-Match'))
+        if request.headers.get('If-None-Match') == '"v1"':
+            return {'status_code': 304, 'content': b''}
+        response = unifiedHttMock(url, request)
+        response['headers'] = {'ETag': '"v1"'}
+        return response
+
+    ResponseCache.invalidate()
+    DiskCache.enable(str(tmpdir))
+    try:
+        with HTTMock(etagMock):
+            first = makeAPICall(ApiCalls.federations)
+            assert requestList == [None]
+
+            ResponseCache.invalidate()
+            assert makeAPICall(ApiCalls.federations) == first
+            assert requestList == [None]
+
+            monkeypatch.setattr(DiskCache, "minTTL", 0)
+            monkeypatch.setitem(ResponseCache.ttlPolicy, ApiCalls.federations, 1e-6)
+            ResponseCache.invalidate()
+            time.sleep(0.01)
+            assert makeAPICall(ApiCalls.federations) == first
+            assert requestList == [None, '"v1"']
+
+            stored = DiskCache.stored
+            makeAPICall(ApiCalls.matches, {'idCompetition': 2000000019, 'idSeason': 2000011119,
+                                           'from': "2018-08-24T00:00:00Z", 'to': "2018-09-07T00:00:00Z"})
+            assert DiskCache.stored == stored
+    finally:
+        DiskCache.disable()
+        ResponseCache.invalidate()
+
+def testSingleFlight():
+    """
+    Identical calls running at the same time share a single request
+    """
+    requestList = []
+
+    def slowMock(url, request):
+        requestList.append(request.path_url)
+        time.sleep(0.2)
+        return unifiedHttMock(url, request)
+
+    ResponseCache.invalidate()
+    deduplicated = SingleFlight.deduplicated
+    barrier = threading.Barrier(5)
+    results = []
+
+    def call():
+        barrier.wait()
+        results.append(makeMiddlewareCall(DataCalls.liveData + "/1"))
+
+    with HTTMock(slowMock):
+        threadList = [threading.Thread(target=call) for i in range(5)]
+        for i in threadList:
+            i.start()
+        for i in threadList:
+            i.join()
+
+    assert len(requestList) == 1
+    assert len(results) == 5
+    assert SingleFlight.deduplicated == deduplicated + 4
+    assert SingleFlight.inFlight == {}
+    ResponseCache.invalidate()
+
+def testSingleFlightError():
+    """
+    Failing calls raise their error and are removed from the running calls
+    """
+    def fail():
+        raise ValueError("failed")
+
+    with pytest.raises(ValueError):
+        SingleFlight.do("failing", fail)
+    assert SingleFlight.inFlight == {}
+
+def legacyDecodeJsonp(content: bytes):
+    data = content.decode()
+    data = re.sub(r"_\w+\(", "", data)
+    data = data.replace(")", "")
+    return json.loads(data)
+
+def testDecodeJsonp():
+    """
+    Only the callback is removed, brackets within the payload are kept
+    """
+    payload = {"match": {"teamHomeName": "Bayern (A)", "events": [1, 2]}}
+    assert decodeJsonp(json.dumps(payload).encode()) == payload
+    assert decodeJsonp(f"_callback({json.dumps(payload)});".encode()) == payload
+    assert decodeJsonp(f" _cb( {json.dumps(payload)} ) ".encode()) == payload
+    with pytest.raises(json.JSONDecodeError):
+        decodeJsonp(b"")
+    with pytest.raises(json.JSONDecodeError):
+        decodeJsonp(b"_callback(")
+
+def testDecodeJsonpLive():
+    """
+    The live fixture is decoded without touching the payload, unlike the former regex/replace implementation
+    """
+    with open(path + "live.json", "rb") as f:
+        payload = f.read()
+
+    assert decodeJsonp(b"_jsonpCallback(" + payload + b")") == json.loads(payload)
+
+def testIterPlayerInfo():
+    """
+    The player database is parsed while streaming, also if entries are split between chunks
+    """
+    with HTTMock(unifiedHttMock):
+        players = list(iterPlayerInfo(chunkSize=16))
+
+    assert len(players) == 4
+    for i in players:
+        assert isinstance(i, Player)
+    assert players[0].lastName == "mueller"
+    assert players[0].firstName == "thomas"
+    assert players[0].imageLink == "https://cdn.soccerwiki.org/images/player/1234.jpg"
+    assert players[3].imageLink == "https://cdn.soccerwiki.org/images/player/missing_player.jpg"
+
+def testRateLimiterPriority(monkeypatch):
+    """
+    Bulk calls leave the reserved tokens to live calls
+    """
+    monkeypatch.setattr(RateLimiter, "buckets", {})
+    monkeypatch.setattr(RateLimiter, "burst", RateLimiter.liveReserve + 1)
+    assert RateLimiter.tryAcquire("test", live=False) == 0
+    assert RateLimiter.tryAcquire("test", live=False) > 0
+    for i in range(RateLimiter.liveReserve):
+        assert RateLimiter.tryAcquire("test", live=True) == 0
+    assert RateLimiter.tryAcquire("test", live=True) > 0
+    assert RateLimiter.isLive(DataCalls.liveData + "/1234")
+    assert not RateLimiter.isLive(ApiCalls.matches)
+
+def testRateLimiterBackoff(monkeypatch):
+    """
+    Throttled calls are retried and reduce the rate for the host
+    """
+    statusList = [429, 503]
+
+    def throttlingMock(url, request):
+        if len(statusList) != 0:
+            return {'status_code': statusList.pop(0), 'content': b''}
+        return unifiedHttMock(url, request)
+
+    monkeypatch.setattr(RateLimiter, "buckets", {})
+    monkeypatch.setattr(RateLimiter, "backoffBase", 0.001)
+    monkeypatch.setattr(RateLimiter, "maxRate", 1000.0)
+    retries = RateLimiter.retries
+    ResponseCache.invalidate()
+    with HTTMock(throttlingMock):
+        result = makeAPICall(ApiCalls.federations)
+
+    assert isinstance(result, list)
+    assert RateLimiter.retries == retries + 2
+    assert RateLimiter.budget()["api.fifa.com"]['rate'] < RateLimiter.maxRate
+    assert RateLimiter.backoff(0, "2") == 2
+    assert RateLimiter.backoff(0, "3600") == RateLimiter.retryAfterMax
+    assert RateLimiter.backoff(100) <= RateLimiter.backoffMax
+    ResponseCache.invalidate()
+
+def testRateLimiterErrors(monkeypatch):
+    """
+    Timeouts are retried and reduce the rate as well, the error is raised once the retries are used up
+    """
+    def timeoutMock(url, request):
+        raise requests.Timeout("Read timed out")
+
+    monkeypatch.setattr(RateLimiter, "buckets", {})
+    monkeypatch.setattr(RateLimiter, "backoffBase", 0.001)
+    monkeypatch.setattr(RateLimiter, "maxRate", 1000.0)
+    monkeypatch.setattr(RateLimiter, "maxRetries", 2)
+    retries = RateLimiter.retries
+    throttled = RateLimiter.throttled
+    ResponseCache.invalidate()
+    with HTTMock(timeoutMock):
+        with pytest.raises(requests.Timeout):
+            makeAPICall(ApiCalls.federations)
+
+    assert RateLimiter.retries == retries + 2
+    assert RateLimiter.throttled == throttled + 3
+    assert RateLimiter.running == 0
+
+    monkeypatch.setattr(RateLimiter, "maxConcurrent", 1)
+    slots = RateLimiter.slots()
+    assert slots.acquire(blocking=False)
+    assert not slots.acquire(blocking=False)
+    slots.release()
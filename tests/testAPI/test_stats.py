@@ -0,0 +1,24 @@
+import pytest
+from httmock import HTTMock
+
+from api.calls import ResponseCache, Fingerprints
+from api.stats import currentSeason
+from database.handler import getAndSaveData, getAllFederations
+from database.models import Competition, Association, Season
+from tests.testAPI.test_calls import unifiedHttMock
+
+@pytest.mark.asyncio
+async def testCurrentSeason(transactional_db):
+    Fingerprints.clear()
+    ResponseCache.invalidate()
+    with HTTMock(unifiedHttMock):
+        getAndSaveData(getAllFederations)
+        Association(id="GER", clear_name="Germany").save()
+        competition = Competition(id=2000000019, federation_id="UEFA", clear_name="Bundesliga", association_id="GER")
+        competition.save()
+
+        season = await currentSeason(competition)
+
+    assert Season.objects.filter(competition=competition).count() != 0
+    assert season == Season.objects.filter(competition=competition).order_by('start_date').last()
+    assert await currentSeason(competition) == season
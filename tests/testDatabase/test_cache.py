@@ -0,0 +1,56 @@
+import pytest
+
+from database.cache import SettingsCache, PermissionCache
+from database.models import Settings, DiscordUsers
+
+@pytest.fixture(autouse=True)
+def enable_db_access_for_all_tests(db):
+    SettingsCache.clear()
+    yield
+    SettingsCache.clear()
+
+def testSettingsCache(django_assert_num_queries):
+    Settings(name="prefix", value="?").save()
+    with django_assert_num_queries(1):
+        assert SettingsCache.get("prefix", "!") == "?"
+        assert SettingsCache.get("defaultCategory") is None
+        assert SettingsCache.get("startCommando", "none") == "none"
+
+    SettingsCache.setSync("prefix", "$")
+    SettingsCache.setSync("defaultCategory", "live")
+    with django_assert_num_queries(0):
+        assert SettingsCache.get("prefix") == "$"
+        assert SettingsCache.get("defaultCategory") == "live"
+    assert Settings.objects.get(name="prefix").value == "$"
+    assert Settings.objects.count() == 2
+
+@pytest.mark.asyncio
+async def testSettingsCacheAsync():
+    SettingsCache.load()
+    await SettingsCache.set("startCommando", "python3 .")
+    assert await SettingsCache.asyncGet("startCommando") == "python3 ."
+    assert Settings.objects.get(name="startCommando").value == "python3 ."
+
+@pytest.mark.asyncio
+async def testPermissionCache(django_assert_num_queries):
+    PermissionCache.clear()
+    DiscordUsers(id=1, name="admin", userLevel=5).save()
+    with django_assert_num_queries(2):
+        for i in range(3):
+            assert PermissionCache.lookup(1) == 5
+            assert PermissionCache.lookup(2) is None
+
+    await PermissionCache.set(2, "user", 3)
+    with django_assert_num_queries(0):
+        assert await PermissionCache.asyncLookup(2) == 3
+    assert DiscordUsers.objects.get(id=2).userLevel == 3
+
+    DiscordUsers(id=3, name="other", userLevel=1).save()
+    PermissionCache.invalidate(3)
+    assert PermissionCache.lookup(3) == 1
+
+    assert PermissionCache.load() == 3
+    with django_assert_num_queries(0):
+        assert PermissionCache.lookup(1) == 5
+        assert PermissionCache.lookup(4) is None
+    PermissionCache.clear()
@@ -0,0 +1,79 @@
+import pytest
+import threading
+
+from django.db import IntegrityError, connection
+
+from database.executor import DBExecutor, DBWriter, asyncDB
+from database.models import Settings
+
+@asyncDB
+def saveSetting(name : str, value : str):
+    Settings(name=name, value=value).save()
+    return threading.current_thread().name
+
+@pytest.mark.asyncio
+async def testDBExecutor(transactional_db):
+    calls = DBExecutor.statistics()['calls']
+
+    threadName = await saveSetting("prefix", "?")
+    assert threadName != threading.current_thread().name
+    assert await DBExecutor.run(lambda: Settings.objects.get(name="prefix").value) == "?"
+    assert await DBExecutor.run(Settings.objects.filter(name="unknown").exists) == False
+
+    statistics = DBExecutor.statistics()
+    assert statistics['calls'] == calls + 3
+    assert statistics['pending'] == 0
+
+@pytest.mark.asyncio
+async def testDBExecutorKeepsConnections(transactional_db):
+    def closeAt():
+        Settings.objects.filter(name="prefix").exists()
+        return connection.close_at
+
+    for i in range(DBExecutor.maxWorkers * 2):
+        assert await DBExecutor.run(closeAt) is None
+
+@pytest.mark.asyncio
+async def testDBExecutorError(transactional_db):
+    with pytest.raises(Settings.DoesNotExist):
+        await DBExecutor.run(Settings.objects.get, name="unknown")
+    assert DBExecutor.statistics()['pending'] == 0
+
+@pytest.fixture
+def writer(transactional_db):
+    DBWriter.start()
+    yield DBWriter
+    DBWriter.stop()
+
+@pytest.mark.asyncio
+async def testDBWriterBatches(writer):
+    started = threading.Event()
+    release = threading.Event()
+
+    def block():
+        started.set()
+        return release.wait()
+
+    blocking = writer.submit(block)
+    started.wait()
+    batches = writer.statistics()['batches']
+
+    futures = [writer.submit(Settings(name=f"setting{i}", value=str(i)).save) for i in range(5)]
+    futures.append(writer.submit(Settings(name="setting0", value="duplicate").save))
+    futures.append(writer.submit(lambda: threading.current_thread().name))
+    release.set()
+
+    assert blocking.result() == True
+    for future in futures[:5]:
+        future.result()
+    with pytest.raises(IntegrityError):
+        futures[5].result()
+    assert futures[6].result() == "db-writer"
+    assert writer.statistics()['batches'] == batches + 2
+
+    assert await writer.run(Settings.objects.get(name="setting0").delete) == (1, {'database.Settings': 1})
+    assert Settings.objects.filter(name__startswith="setting").count() == 4
+
+def testDBWriterInline(db):
+    assert not DBWriter.running()
+    assert DBWriter.write(lambda: threading.current_thread().name) == threading.current_thread().name
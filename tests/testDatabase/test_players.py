@@ -0,0 +1,73 @@
+import pytest
+from httmock import HTTMock
+
+from database.handler import importPlayerInfo
+from database.models import Player
+from database.players import PlayerLookup,PlayerIndexFile
+from tests.testAPI.test_calls import unifiedHttMock
+
+imageUrl = "https://cdn.soccerwiki.org/images/player/"
+
+@pytest.fixture(autouse=True)
+def players(db):
+    with HTTMock(unifiedHttMock):
+        importPlayerInfo()
+    yield
+    PlayerLookup.index = None
+
+def testPlayerLookup(django_assert_num_queries):
+    assert PlayerLookup.loaded()
+    with django_assert_num_queries(0):
+        assert PlayerLookup.image("Thomas Müller") == imageUrl + "1234.jpg"
+        assert PlayerLookup.image("T. Müller") == imageUrl + "1234.jpg"
+        assert PlayerLookup.image("Manuel Neuer") == imageUrl + "2345.jpg"
+        assert PlayerLookup.image("Joshua Kimmich") == imageUrl + "missing_player.jpg"
+        assert PlayerLookup.image("Lionel Messi") is None
+
+def testPlayerLookupAmbiguous():
+    Player(firstName="gerd", lastName="mueller", birthDate="03-11-1945", imageLink="gerd.jpg").save()
+    Player(firstName="gerd", lastName="mueller", birthDate="01-01-1950", imageLink="other.jpg").save()
+    assert PlayerLookup.load() == 6
+
+    assert PlayerLookup.image("Gerd Müller") == "gerd.jpg"
+    assert PlayerLookup.image("Thomas Müller") == imageUrl + "1234.jpg"
+    assert PlayerLookup.image("Unknown Müller") == imageUrl + "1234.jpg"
+
+@pytest.mark.asyncio
+async def testPlayerLookupAsync():
+    assert await PlayerLookup.asyncImage("Marco Reus") == imageUrl + "3456.jpg"
+
+def testPlayerIndexFile(tmpdir):
+    Player(firstName="gerd", lastName="mueller", birthDate="03-11-1945", imageLink="gerd.jpg").save()
+    Player(firstName="lisa", lastName="mueller", birthDate="01-01-1990", imageLink="lisa.jpg").save()
+    Player(firstName="marco", lastName="reus", birthDate="01-01-1990", imageLink="other.jpg").save()
+    names = ["Thomas Müller", "Gerd Müller", "Lisa Müller", "Unknown Müller", "Manuel Neuer", "Marco Reus",
+             "Joshua Kimmich", "Lionel Messi", ""]
+    PlayerLookup.load()
+    expected = [PlayerLookup.image(name) for name in names]
+
+    PlayerIndexFile.enable(str(tmpdir))
+    try:
+        assert PlayerLookup.load() == 7
+        assert isinstance(PlayerLookup.index, PlayerIndexFile)
+        assert tmpdir.join(PlayerIndexFile.fileName).check()
+        assert [PlayerLookup.image(name) for name in names] == expected
+
+        indexFile = PlayerLookup.index
+        assert PlayerLookup.load() == 7
+        assert PlayerLookup.index.path == indexFile.path
+        assert PlayerLookup.index.generation == indexFile.generation
+        assert indexFile.find("mueller", "thomas") == imageUrl + "1234.jpg"
+
+        Player(firstName="erling", lastName="haaland", birthDate="21-07-2000", imageLink="haaland.jpg").save()
+        PlayerIndexFile.newGeneration()
+        assert PlayerLookup.load() == 8
+        assert PlayerLookup.image("Erling Haaland") == "haaland.jpg"
+
+        Player.objects.filter(lastName="haaland").update(imageLink="new.jpg")
+        PlayerIndexFile.newGeneration()
+        assert PlayerLookup.load() == 8
+        assert PlayerLookup.image("Erling Haaland") == "new.jpg"
+    finally:
+        PlayerIndexFile.disable()
+        PlayerLookup.swap(None)
@@ -0,0 +1,39 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from database.pragmas import applyPragmas, maintainDatabase
+
+@pytest.fixture(autouse=True)
+def enable_db_access_for_all_tests(db):
+    pass
+
+def pragma(name : str):
+    with connection.cursor() as cursor:
+        cursor.execute(f"PRAGMA {name}")
+        return cursor.fetchone()[0]
+
+def testApplyPragmas(settings):
+    profile = settings.SQLITE_PRAGMAS
+    settings.SQLITE_PRAGMAS = {'cache_size': -1234, 'temp_store': 'MEMORY', 'busy_timeout': 4321}
+    applyPragmas(None, connection)
+    assert pragma("cache_size") == -1234
+    assert pragma("temp_store") == 2
+    assert pragma("busy_timeout") == 4321
+
+    settings.SQLITE_PRAGMAS = dict([(key, profile[key]) for key in ['cache_size', 'temp_store', 'busy_timeout']])
+    applyPragmas(None, connection)
+
+def testPersistentPragmas(settings):
+    journalMode = pragma("journal_mode")
+    settings.SQLITE_PRAGMAS = {'journal_mode': journalMode.upper()}
+    with CaptureQueriesContext(connection) as queries:
+        applyPragmas(None, connection)
+    assert [query['sql'] for query in queries.captured_queries] == ["PRAGMA journal_mode"]
+
+def testPragmasOnConnect():
+    assert pragma("synchronous") == 1
+    assert pragma("busy_timeout") == 5000
+
+def testMaintainDatabase():
+    assert set(maintainDatabase().keys()) == {'busy', 'logFrames', 'checkpointed'}
@@ -0,0 +1,45 @@
+import pytest
+from django.db import connection
+
+from database.models import Competition,Match,Goal,Player
+
+@pytest.fixture(autouse=True)
+def enable_db_access_for_all_tests(db):
+    pass
+
+def queryPlan(query) -> list:
+    """
+    Runs EXPLAIN QUERY PLAN for a given queryset and returns the details of each step
+    :param query: Django queryset
+    :return: List of plan details, i.e. "SEARCH TABLE database_match USING INDEX ..."
+    """
+    sql, params = query.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+        return [row[-1] for row in cursor.fetchall()]
+
+def assertNoFullScan(query):
+    """
+    Fails if any step of the query plan is a full table scan
+    :param query: Django queryset
+    """
+    for detail in queryPlan(query):
+        assert not (detail.startswith("SCAN") and "INDEX" not in detail), f"Full table scan: {detail}"
+
+hotQueries = [
+    lambda: Player.objects.filter(lastName="mueller"),
+    lambda: Player.objects.filter(lastName="mueller").filter(firstName="thomas"),
+    lambda: Match.objects.filter(matchday=1).filter(competition_id=1).filter(season_id=1).order_by('date'),
+    lambda: Match.objects.filter(competition_id=1).filter(match_status=3),
+    lambda: Match.objects.filter(match_status=3),
+    lambda: Competition.objects.filter(clear_name="Bundesliga"),
+    lambda: Goal.objects.filter(player="Mueller").order_by('match__date'),
+]
+
+@pytest.mark.parametrize("query", hotQueries)
+def testNoFullScan(query):
+    assertNoFullScan(query())
+
+def testDetectsFullScan():
+    with pytest.raises(AssertionError):
+        assertNoFullScan(Player.objects.filter(birthDate="1989-09-13"))
@@ -0,0 +1,239 @@
+import pytest
+import requests
+from httmock import HTTMock
+
+from database.handler import *
+from api.calls import ApiCalls,Fingerprints,ResponseCache
+from database.models import DiscordServer,Association
+from tests.testAPI.test_calls import unifiedHttMock
+
+@pytest.fixture(autouse=True)
+def enable_db_access_for_all_tests(db):
+    Fingerprints.clear()
+    ResponseCache.invalidate()
+    MatchSync.lastFullSync.clear()
+    SettingsCache.clear()
+
+def testImportPlayerInfo():
+    with HTTMock(unifiedHttMock):
+        count = importPlayerInfo(batchSize=3)
+
+    assert count == 4
+    assert Player.objects.count() == 4
+    assert Player.objects.get(lastName="mueller").firstName == "thomas"
+
+def testImportPlayerInfoInterrupted(monkeypatch):
+    def interruptedPlayerInfo():
+        for index, player in enumerate(iterPlayerInfo()):
+            if index == 3:
+                raise requests.ConnectionError("Connection reset")
+            yield player
+
+    with HTTMock(unifiedHttMock):
+        monkeypatch.setattr("database.handler.iterPlayerInfo", interruptedPlayerInfo)
+        with pytest.raises(requests.ConnectionError):
+            importPlayerInfo(batchSize=2)
+        assert Player.objects.count() == 2
+        assert SettingsCache.get('playerImport') == "started"
+
+        monkeypatch.undo()
+        importPlayerInfo(batchSize=2)
+
+    assert Player.objects.count() == 4
+    assert SettingsCache.get('playerImport') == "done"
+
+def testGetAndSaveDataPlayerInfo():
+    with HTTMock(unifiedHttMock):
+        getAndSaveData(getAllPlayerInfo)
+
+    assert Player.objects.count() == 4
+
+def teamHttMock(url, request):
+    """
+    Returns the requested team for specific team calls, so every team id can be resolved
+    """
+    if ApiCalls.specificTeam + "/" in request.path_url and ApiCalls.teams not in request.path_url:
+        response = unifiedHttMock(url, request)
+        response['content']['IdTeam'] = request.path_url.split("/")[-1]
+        return response
+    return unifiedHttMock(url, request)
+
+@pytest.fixture
+def preMatches():
+    with HTTMock(unifiedHttMock):
+        getAndSaveData(getAllFederations)
+        getAndSaveData(getAllCountries)
+        getAndSaveData(getAllCompetitions, idFederation="UEFA")
+        Association(id="GER", clear_name="Germany").save()
+        Competition(id=2000000019, federation_id="UEFA", clear_name="Bundesliga", association_id="GER").save()
+        getAndSaveData(getAllSeasons, idCompetitions=2000000019)
+
+def testResolveMissingTeams(preMatches):
+    with HTTMock(teamHttMock):
+        matches = getAllMatches(idCompetitions=2000000019, idSeason=2000011119)
+        teamIDs = set([i.home_team_id for i in matches] + [i.away_team_id for i in matches]) - {None}
+
+        assert resolveMissingTeams(matches) == len(teamIDs)
+        assert Team.objects.count() == len(teamIDs)
+        assert resolveMissingTeams(matches) == 0
+
+def testGetAndSaveMatches(preMatches):
+    with HTTMock(teamHttMock):
+        getAndSaveData(getAllMatches, idCompetitions=2000000019, idSeason=2000011119)
+
+    assert Match.objects.count() == 306
+
+def testUpdateOverlayAndMatches(preMatches):
+    competition = Competition.objects.get(id=2000000019)
+    season = Season.objects.get(id=2000011119)
+    server = DiscordServer(name="temp")
+    server.save()
+    CompetitionWatcher(competition=competition, current_season=season, applicable_server=server).save()
+
+    with HTTMock(teamHttMock):
+        updateOverlayData()
+        updateMatches()
+
+    assert Federation.objects.count() != 0
+    assert Season.objects.filter(competition=competition).count() != 0
+    assert Match.objects.filter(competition=competition).count() == 306
+
+def testSyncParallelFailure(preMatches):
+    def failing(**kwargs):
+        raise KeyError("IdMatch")
+
+    with HTTMock(teamHttMock):
+        syncParallel([(failing, {}),
+                      (getAllMatches, {'idCompetitions': 2000000019, 'idSeason': 2000011119})])
+
+    assert Match.objects.count() == 306
+
+def testSyncParallelTimeout(preMatches):
+    def timeout(**kwargs):
+        raise requests.Timeout("Read timed out")
+
+    def missingCompetition(**kwargs):
+        return [Season(id=1, federation_id="UEFA", competition_id=1, clear_name="Unknown",
+                       start_date=datetime.utcnow(), end_date=datetime.utcnow())]
+
+    with HTTMock(teamHttMock):
+        failed = syncParallel([(timeout, {}), (missingCompetition, {}),
+                               (getAllMatches, {'idCompetitions': 2000000019, 'idSeason': 2000011119})])
+
+    assert set([func for func, kwargs in failed]) == {timeout, missingCompetition}
+    assert Match.objects.count() == 306
+
+def testBulkUpsert(preMatches):
+    with HTTMock(teamHttMock):
+        matches = getAllMatches(idCompetitions=2000000019, idSeason=2000011119)
+        result = saveData(getAllMatches, matches)
+        assert result == {'inserted': 306, 'updated': 0, 'unchanged': 0}
+
+        Match.objects.filter(id=matches[0].id).update(score_home_team=99)
+        matches = getAllMatches(idCompetitions=2000000019, idSeason=2000011119)
+        result = saveData(getAllMatches, matches)
+        assert result == {'inserted': 0, 'updated': 1, 'unchanged': 305}
+        assert Match.objects.get(id=matches[0].id).score_home_team == matches[0].score_home_team
+
+def testCompetitionWithoutCountry(preMatches):
+    competition = Competition(id=1, federation_id="UEFA", clear_name="Unknown", association_id="XXX")
+    assert saveData(getAllCompetitions, [competition]) == {'inserted': 0, 'updated': 0, 'unchanged': 0}
+    with pytest.raises(IntegrityError):
+        saveData(getAllSeasons, [Season(id=1, federation_id="XXX", competition_id=1, clear_name="Unknown",
+                                        start_date=datetime.utcnow(), end_date=datetime.utcnow())])
+
+def testFingerprintsCompetitionWithoutCountry():
+    with HTTMock(unifiedHttMock):
+        getAndSaveData(getAllFederations)
+        getAndSaveData(getAllCompetitions, idFederation="UEFA")
+        assert Competition.objects.count() == 0
+
+        getAndSaveData(getAllCountries)
+        ResponseCache.invalidate()
+        data, tracker = Fingerprints.fetch(getAllCompetitions, {'idFederation': "UEFA"})
+        assert len(data) != 0
+        saveData(getAllCompetitions, data, tracker)
+
+    associations = set(Association.objects.values_list('id', flat=True))
+    assert Competition.objects.count() == len([i for i in data if i.association_id in associations])
+    assert Competition.objects.count() != 0
+
+def testFingerprintsSkipUnchanged(preMatches):
+    changedScore = {'value': None}
+
+    def changingHttMock(url, request):
+        response = teamHttMock(url, request)
+        if ApiCalls.matches in request.path_url and changedScore['value'] is not None:
+            response['content']['Results'][0]['HomeTeamScore'] = changedScore['value']
+        return response
+
+    kwargs = {'idCompetitions': 2000000019, 'idSeason': 2000011119}
+    with HTTMock(changingHttMock):
+        getAndSaveData(getAllMatches, **kwargs)
+        assert Match.objects.count() == 306
+
+        ResponseCache.invalidate()
+        skippedCalls = Fingerprints.statistics()['skippedCalls']
+        data, tracker = Fingerprints.fetch(getAllMatches, kwargs)
+        assert data == []
+        assert Fingerprints.statistics()['skippedCalls'] == skippedCalls + 1
+        tracker.commit()
+
+        ResponseCache.invalidate()
+        changedScore['value'] = 99
+        data, tracker = Fingerprints.fetch(getAllMatches, kwargs)
+        assert len(data) == 1
+        assert saveData(getAllMatches, data, tracker) == {'inserted': 0, 'updated': 1, 'unchanged': 0}
+        assert Match.objects.get(id=data[0].id).score_home_team == 99
+
+def testDeltaMatchSync(preMatches):
+    paths = []
+
+    def recordingHttMock(url, request):
+        if ApiCalls.matches in request.path_url:
+            paths.append(request.path_url)
+        return teamHttMock(url, request)
+
+    competition = Competition.objects.get(id=2000000019)
+    season = Season.objects.get(id=2000011119)
+    with HTTMock(recordingHttMock):
+        updateMatchesSingleCompetition(competition, season)
+        assert "from=" not in paths[-1]
+        assert Match.objects.count() == 306
+
+        ResponseCache.invalidate()
+        updateMatchesSingleCompetition(competition, season)
+        assert "from=" in paths[-1] and "to=" in paths[-1]
+
+        ResponseCache.invalidate()
+        updateMatchesSingleCompetition(competition, season, full=True)
+        assert "from=" not in paths[-1]
+
+    assert MatchSync.job(competition.id, season.id, full=False) == MatchSync.job(competition.id, season.id, full=False)
+    assert MatchSync.job(competition.id, season.id, full=False)[1]['fromDate'].minute == 0
+
+    MatchSync.lastFullSync[season.id] -= MatchSync.fullSyncInterval + timedelta(minutes=1)
+    assert MatchSync.needsFullSync(season.id)
+
+def testMatchDayObjectsQueries(preMatches, django_assert_num_queries):
+    competition = Competition.objects.get(id=2000000019)
+    season = Season.objects.get(id=2000011119)
+    server = DiscordServer(name="temp")
+    server.save()
+    CompetitionWatcher(competition=competition, current_season=season, applicable_server=server).save()
+    Settings(name="defaultCategory", value="live").save()
+    with HTTMock(teamHttMock):
+        getAndSaveData(getAllMatches, idCompetitions=2000000019, idSeason=2000011119)
+
+    with django_assert_num_queries(3):
+        matchDayObjects = getNextMatchDayObjects()
+        titles = [match.title for md in matchDayObjects[competition.clear_name].values()
+                  for key in ['passedMatches', 'currentMatches', 'upcomingMatches'] for match in md[key]]
+
+    matchDays = matchDayObjects[competition.clear_name]
+    assert len(titles) == 306
+    assert set(matchDays.keys()) == set(Match.objects.values_list('matchday', flat=True))
+    for md, data in matchDays.items():
+        assert data['category'] == "live"
+        assert data['start'] == Match.objects.filter(matchday=md).order_by('date').first().date - timedelta(hours=1)
+        assert data['end'] == Match.objects.filter(matchday=md).order_by('date').last().date + timedelta(hours=3)
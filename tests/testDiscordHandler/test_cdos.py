@@ -1,7 +1,12 @@
 import pytest
+import random
+import re
 from httmock import HTTMock
 
-from discord_handler.cdo_meta import getParameters
+from types import SimpleNamespace
+
+from discord_handler.cdo_meta import getParameters,CommandoIndex,DiscordCommando,CommandArguments,ReactionRouter
+import discord_handler.cdos
 from tests.testAPI.test_calls import unifiedHttMock
 
 def testCheckCompetitionParameter():
@@ -20,6 +25,160 @@ def testCheckCompetitionParameter():
     assert result["parameter0"] == "Bundesliga"
     assert result["parameter1"] == "GER"
 
+benchmarkMessages = ["!addCompetition Bundesliga,GER", "!scores", "!setPermissions <@1234>, 3",
+                     "!goals Müller role=Fans channel=123", "!addCompetition Premier League, ENG, role=Fans"]
+
+def legacyGetParameters(msgContent : str):
+    retDict = {}
+    optPar = re.findall(r"\w+=[/\w\+]+",msgContent)
+    for i in optPar:
+        key,val = i.split("=")
+        retDict[key] = val
+        msgContent = msgContent.replace(i,"")
+    msgContent = re.sub(r"\s*<@\w+>","",msgContent)
+    data = msgContent.split(",")
+    data[0] = data[0].replace(data[0].split(" ")[0], "")
+    if data[0] == "":
+        data.remove(data[0])
+    for index in range(0,len(data)):
+        retDict[f"parameter{index}"] = data[index].strip()
+    return retDict
+
+def randomMessage(rand : random.Random) -> str:
+    """
+    Random command call built from the command grammar. Options and words are unique, so the legacy parser
+    doesn't mangle the message
+    """
+    words = ["Bundesliga", "GER", "Müller", "1.FC", "Köln", "Real-Madrid", "St. Pauli", "o'neil", "2019", "ß"]
+    msg = rand.choice(["!addCompetition", "!goals", "?scores", "!setPermissions"])
+    parts = []
+    for index in range(rand.randint(0, 6)):
+        kind = rand.random()
+        if kind < 0.15:
+            parts.append(f" opt{index}={rand.choice(['5', 'a/b', 'x+y', 'Fans'])}{index}")
+        elif kind < 0.3:
+            parts.append(f" <@{rand.randint(1, 10 ** 18)}>")
+        elif kind < 0.5:
+            parts.append(rand.choice([",", ", ", " ,"]))
+        else:
+            parts.append(" " * rand.randint(1, 2) + rand.choice(words))
+    return msg + "".join(parts)
+
+def testCommandArgumentsFuzz():
+    rand = random.Random(2019)
+    for _ in range(2000):
+        msg = randomMessage(rand)
+        expected = legacyGetParameters(msg)
+        #the former parser turned trailing whitespace into an empty parameter
+        if expected.get("parameter0") == "" and "parameter1" not in expected and "," not in msg:
+            del expected["parameter0"]
+        assert getParameters(msg) == expected, msg
+
+def testCommandArgumentsRandomInput():
+    rand = random.Random(4)
+    alphabet = "ab=/+,<@>!& \t\nüß1_.-"
+    for _ in range(2000):
+        msg = "".join(rand.choice(alphabet) for _ in range(rand.randint(0, 30)))
+        args = CommandArguments.parse(msg)
+        assert msg.startswith(args.commando)
+        assert len(args.positional) in (msg.count(","), msg.count(",") + 1)
+        assert all(i == i.strip() for i in args.positional)
+        for key, value in args.options.items():
+            assert f"{key}={value}" in msg
+
+def testCommandArguments():
+    args = CommandArguments.parse("!setPermissions <@!1234>, 3 role=Fans")
+    assert args == CommandArguments("!setPermissions", ["3"], {"role": "Fans"}, ["!1234"])
+    assert args.toDict() == {"role": "Fans", "parameter0": "3"}
+
+    assert getParameters("!goals !goals") == {"parameter0": "!goals"}
+    assert getParameters("!scores ") == {}
+    #positional parameters are numbered by their commas, so parameters left empty by options are kept as "" and
+    #the following ones keep their position, as with the former parser
+    assert getParameters("!add role=Fans,GER") == {"role": "Fans", "parameter0": "", "parameter1": "GER"}
+    #the former parser turned ba=b into "b", as it removed a=b from it
+    assert getParameters("!add a=b, ba=b") == {"a": "b", "ba": "b", "parameter0": "", "parameter1": ""}
+
+def testCommandArgumentsLegacy():
+    """
+    Common command calls give the same parameters as with the former parser
+    """
+    for msg in benchmarkMessages:
+        assert getParameters(msg) == legacyGetParameters(msg)
+
+def testCommandoIndex():
+    find = lambda content, prefix="!": getattr(CommandoIndex.find(content, prefix), 'commando', None)
+
+    assert find("!add Bundesliga") == "add"
+    assert find("!addCompetition Bundesliga,GER") == "add"
+    assert find("!add,Bundesliga") == "add"
+    assert find("!about") == "about"
+    assert find("!goals Müller") == "goals"
+    assert find("!getPermissions <@1234>") == "getPermissions"
+    assert find("!setStartCdo python3 .") == "setStartCdo"
+    assert find("?scores", prefix="?") == "scores"
+    assert find("!scores", prefix="?") is None
+    assert find("hello !add") is None
+    assert find("!") is None
+    assert find("! add") is None
+    assert find("!ad") is None
+    assert find("!unknown") is None
+
+    for commando in DiscordCommando.allCommandos():
+        assert CommandoIndex.find("!" + commando.commando + " parameter", "!") == commando
+
+def testCommandoIndexPrefixes(monkeypatch):
+    """
+    Exact commandos are found in the dict, longer tokens by their longest commando, ambiguous and unknown
+    prefixes are rejected
+    """
+    monkeypatch.setattr(CommandoIndex, "commandos", {})
+    monkeypatch.setattr(CommandoIndex, "trie", {})
+    for name in ["add", "addTeam", "about", "st", "stop"]:
+        CommandoIndex.add(SimpleNamespace(commando=name))
+    find = lambda content: getattr(CommandoIndex.find(content, "!"), 'commando', None)
+
+    assert find("!addTeam Bayern") == "addTeam"
+    assert find("!stop") == "stop"
+    assert find("!addTeams") == "addTeam"
+    assert find("!addCompetition Bundesliga") == "add"
+    assert find("!stopped") == "stop"
+    assert find("!sta") == "st"
+    assert find("!a") is None
+    assert find("!ab") is None
+    assert find("!s") is None
+    assert find("!x") is None
+
+def testReactionRouter(monkeypatch):
+    ReactionRouter.clear()
+    reaction = lambda messageID, emoji="⏩": SimpleNamespace(message=SimpleNamespace(id=messageID), emoji=emoji)
+    received = []
+
+    def confirm(reaction, user):
+        received.append((reaction.message.id, reaction.emoji))
+        return reaction.emoji == "0⃣"
+
+    ReactionRouter.add(1, confirm)
+    ReactionRouter.add(2, lambda reaction, user: received.append(reaction.message.id))
+    assert not ReactionRouter.dispatch(reaction(3), None)
+    assert not ReactionRouter.dispatch(reaction(1), None)
+    assert not ReactionRouter.dispatch(reaction(2), None)
+    assert ReactionRouter.dispatch(reaction(1, "0⃣"), None)
+    assert not ReactionRouter.dispatch(reaction(1, "0⃣"), None)
+    assert received == [(1, "⏩"), 2, (1, "0⃣")]
+    assert list(ReactionRouter.handlers.keys()) == [2]
+
+    monkeypatch.setattr(ReactionRouter, "maxEntries", 3)
+    for messageID in range(10, 15):
+        ReactionRouter.add(messageID, confirm)
+    assert list(ReactionRouter.handlers.keys()) == [12, 13, 14]
+
+    ReactionRouter.clear()
+    monkeypatch.setattr(ReactionRouter, "ttl", 0)
+    ReactionRouter.add(20, confirm)
+    assert not ReactionRouter.dispatch(reaction(20, "0⃣"), None)
+    assert ReactionRouter.statistics() == {'handlers': 0}
+
 """
 @pytest.mark.asyncio
 def testCdoAddCompetition():